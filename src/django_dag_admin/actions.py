@@ -1,16 +1,18 @@
-from itertools import chain
+from django.db.models.expressions import RawSQL
 from django.http import HttpResponseRedirect
 from django.utils.translation import gettext_lazy
 from django.urls import reverse
+from .utils.graph import ANCESTORS, DESCENDANTS, get_closure_sql
+from .views import (
+    ANCESTORS_VAR, CLAN_VAR, DESCENDANTS_VAR, SELECTION_PARAMS
+)
 
 
 def show_decendants(model_admin, request, queryset):
     """
     Add filter to limit the day the the selected descendants
     """
-    def process(node):
-        return node.get_descendant_pks() + [node.pk]
-    return _do_select(model_admin, request, queryset, process)
+    return _do_select(model_admin, request, queryset, DESCENDANTS_VAR, DESCENDANTS)
 show_decendants.short_description = gettext_lazy(  # noqa: E305
     "Show descendants of nodes")
 
@@ -19,10 +21,7 @@ def show_ancestors(model_admin, request, queryset):
     """
     Add filter to limit the node
     """
-    def process(node):
-        return node.get_ancestor_pks() + [node.pk]
-
-    return _do_select(model_admin, request, queryset, process)
+    return _do_select(model_admin, request, queryset, ANCESTORS_VAR, ANCESTORS)
 show_ancestors.short_description = gettext_lazy(  # noqa: E305
     "Show ancestors of nodes")
 
@@ -31,30 +30,38 @@ def show_root_to_leaf_through(model_admin, request, queryset):
     """
     Add filter to limit the node
     """
-    def process(node):
-        return node.get_clan_pks()
-    return _do_select(model_admin, request, queryset, process)
+    return _do_select(model_admin, request, queryset, CLAN_VAR)
 show_root_to_leaf_through.short_description = gettext_lazy(  # noqa: E305
     "Show clan of nodes")
 
 
-def _do_select(model_admin, request, queryset, fn):
+def _reduce_selection(model, queryset, direction):
+    """
+    Drop the selected nodes reached from another selected node in the given
+    ``direction``, they add nothing to the selection. The closure of the
+    whole selection is computed by a single recursive subquery.
+    """
+    if direction is None:
+        return queryset
+    return queryset.exclude(
+        pk__in=RawSQL(*get_closure_sql(model, queryset, direction)))
+
+
+def _do_select(model_admin, request, queryset, param, direction=None):
+    """
+    Redirect to the changelist filtered on the selected nodes, the
+    descendants, ancestors or clan being resolved by the changelist query
+    rather than listed in the url.
+    """
     clst = model_admin.get_changelist_instance(request)
     model = model_admin.model
     opts = model._meta
+    seeds = _reduce_selection(model, queryset.order_by(), direction)
     urlparams = clst.get_query_string({
-        'pk__in': ','.join(
-            set(map(
-                str,
-                chain(
-                    *map(
-                        fn,
-                        queryset.order_by().all()
-                    )
-                )
-            ))
+        param: ','.join(
+            map(str, seeds.values_list('pk', flat=True).iterator())
         )
-    })
+    }, remove=SELECTION_PARAMS)
     post_url = reverse('admin:%s_%s_changelist' %
                     (opts.app_label, opts.model_name),
                     current_app=model_admin.admin_site.name
@@ -1,11 +1,32 @@
 # -*- coding: utf-8 -*-
+import json
+from collections import defaultdict
+from functools import wraps
+from itertools import chain
 from django.conf.urls import url
-from django.contrib import admin, messages
-from django.core.exceptions import ValidationError
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.contrib import admin
+from django.contrib.admin.views.main import IncorrectLookupParameters
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import IntegrityError, router, transaction
+from django.db.models import CharField, Q, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
 from django.utils.translation import ugettext_lazy as _
 from django_dag.models.order_control import Position
 from .actions import actions as dag_actions
+from .forms import MoveEdgeForm
+from .formset import DjangoDagAdminFormSet
+from .utils.count import ExactCount
+from .utils.counters import connect_counters, has_edge_counters
+from .utils.depth import register_depth_provider
+from .utils.fragments import connect_fragments
+from .utils.graph import get_closure_sql
+from .utils.timing import PhaseTimer
+from .widgets import DagParentSelect
 
 
 class DjangoDagAdmin(admin.ModelAdmin):
@@ -16,6 +37,33 @@ class DjangoDagAdmin(admin.ModelAdmin):
     sort_path_padding_size = None
     sort_path_padding_char = None
     sort_path_seperator = None
+    depth_provider = None
+    count_strategy = None
+    parent_candidates_per_page = 20
+    lazy_tree = False
+    lazy_tree_depth = 1
+    keyset_pagination = False
+    path_cache_model = None
+    row_fragment_cache = False
+    row_fragment_cache_timeout = 300
+    row_version_field = None
+    stream_show_all = False
+    stream_chunk_size = 500
+    virtual_tree = False
+    instrument_changelist = False
+    server_timing_header = False
+
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+        if self.depth_provider is not None:
+            register_depth_provider(model, self.depth_provider(model))
+        if has_edge_counters(model):
+            connect_counters(model)
+        if self.path_cache_model is not None:
+            self.path_cache_model.connect()
+        if self.row_fragment_cache and not self.row_version_field:
+            connect_fragments(model)
+        self.result_counter = (self.count_strategy or ExactCount)(model)
 
     def _get_base_actions(self):
         actions = list([
@@ -28,21 +76,57 @@ class DjangoDagAdmin(admin.ModelAdmin):
         )
         return filter(None, actions)
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
+    @property
+    def path_seperator(self):
+        """The separator placed between node ids in ``dag_node_path``"""
+        if self.path_cache_model is not None:
+            return self.path_cache_model.get_sort_settings()['sepchar']
+        return self.sort_path_seperator or self.model._default_manager.all().path_seperator
+
+    def get_path_cache(self):
+        """
+        Return the ``path_cache_model`` when it holds paths for every node,
+        or None. Nodes lack cached paths until ``rebuild_dag_paths`` has run,
+        or when they were created without signals, by ``bulk_create`` or raw
+        SQL.
+        """
+        if self.path_cache_model is None:
+            return None
+        if self.model._default_manager.filter(dag_paths__isnull=True).exists():
+            return None
+        return self.path_cache_model
+
+    def annotate_paths(self, qs, path_cache=None):
+        """
+        Annotate the nodes of ``qs`` with their paths from the roots, one row
+        per path, as needed to lay out the tree. The paths are read from
+        ``path_cache``, as returned by ``get_path_cache``, when given.
+        """
+        if path_cache is not None:
+            return path_cache.annotate_paths(qs)
+        if self.path_cache_model is not None:
+            # Computed as the cached paths are, path_seperator relies on it
+            return qs.with_sort_sequence(**self.path_cache_model.get_sort_settings())
         return qs.with_sort_sequence(
             padsize=self.sort_path_padding_size or qs.path_padding_size,
             padchar=self.sort_path_padding_char or qs.path_padding_char,
             sepchar=self.sort_path_seperator or qs.path_seperator,
         )
 
+    def get_node_queryset(self, request):
+        """
+        Return the nodes queryset, each node appearing only once. The path
+        annotations are only added by the changelist tree layout.
+        """
+        return self.get_queryset(request)
+
     def get_object(self, request, object_id, from_field=None):
         """
         Return an instance matching the field and value provided, the primary
         key is used if no field is provided. Return ``None`` if no match is
         found or the object_id fails validation.
         """
-        queryset = super().get_queryset(request, )
+        queryset = self.get_node_queryset(request)
         model = queryset.model
         field = model._meta.pk if from_field is None else model._meta.get_field(from_field)
         try:
@@ -58,10 +142,91 @@ class DjangoDagAdmin(admin.ModelAdmin):
         from django_dag_admin.views import DagChangeList
         return DagChangeList
 
-    def get_changelist_instance(self, request):
+    def get_phase_timer(self, request):
+        """
+        Return the timer recording the phases of ``request``, which records
+        nothing unless ``instrument_changelist`` is set. Queries are counted
+        on the read and write databases of the model, moves using the latter.
+        """
+        timer = getattr(request, '_dag_phase_timer', None)
+        if timer is None:
+            timer = request._dag_phase_timer = PhaseTimer(
+                self.model, request,
+                using=[router.db_for_read(self.model), router.db_for_write(self.model)],
+                enabled=self.instrument_changelist,
+            )
+        return timer
+
+    def add_server_timing(self, request, response):
+        """
+        Add the phases recorded for ``request`` to ``response`` as a
+        ``Server-Timing`` header, once the response is rendered.
+        """
+        if not (self.instrument_changelist and self.server_timing_header):
+            return response
+        timer = self.get_phase_timer(request)
+
+        def set_header(response):
+            if timer.phases:
+                response['Server-Timing'] = timer.server_timing()
+
+        if getattr(response, 'is_rendered', True):
+            set_header(response)
+        else:
+            response.add_post_render_callback(set_header)
+        return response
+
+    def timed_view(self, view, phase):
+        """
+        Wrap ``view`` so it is recorded as the ``phase`` of the request
+        """
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with self.get_phase_timer(request).phase(phase):
+                response = view(request, *args, **kwargs)
+            return self.add_server_timing(request, response)
+        return wrapper
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        cl = (getattr(response, 'context_data', None) or {}).get('cl')
+        if getattr(cl, 'streaming', False):
+            response = self.stream_changelist(request, response, cl)
+        return self.add_server_timing(request, response)
+
+    def stream_changelist(self, request, response, cl):
+        """
+        Send the changelist page with its result rows rendered while they are
+        streamed, in place of the marker the ``result_tree`` tag left.
+        """
+        from django_dag_admin.templatetags.admin_dag_tree import (
+            STREAM_MARKER, stream_result_tree
+        )
+        content = response.render().content.decode(response.charset)
+        if STREAM_MARKER not in content:
+            # The template override leaves no place for the streamed rows,
+            # they are rendered in the page instead
+            cl.streaming = False
+            response.content = response.rendered_content
+            return response
+        head, tail = content.split(STREAM_MARKER, 1)
+        streamed = StreamingHttpResponse(
+            chain([head], stream_result_tree(cl, request), [tail]),
+            status=response.status_code,
+        )
+        # Keep the headers and cookies set on the rendered page, the length
+        # of its body isn't the length of the stream
+        for header, value in response.items():
+            if header.lower() != 'content-length':
+                streamed[header] = value
+        streamed.cookies = response.cookies
+        return streamed
+
+    def get_changelist_instance(self, request, load_results=True):
         """
         Return a `ChangeList` instance based on `request`. May raise
-        `IncorrectLookupParameters`.
+        `IncorrectLookupParameters`. Without ``load_results`` the changelist
+        is only set up to render rows, its results are not queried.
         """
         list_display = self.get_list_display(request)
         list_display_links = self.get_list_display_links(request, list_display)
@@ -84,6 +249,7 @@ class DjangoDagAdmin(admin.ModelAdmin):
             self.list_editable,
             self,
             sortable_by,
+            load_results=load_results,
         )
 
     def get_inline_instances(self, request, obj=None):
@@ -118,12 +284,147 @@ class DjangoDagAdmin(admin.ModelAdmin):
             JavaScriptCatalog.as_view(packages=['django-dag-admin']),
             name='javascript-catalog'
         )
+        info = self.model._meta.app_label, self.model._meta.model_name
         new_urls = [
-            url('^move/$', self.admin_site.admin_view(self.move_node), ),
+            url(
+                '^move/$',
+                self.admin_site.admin_view(self.timed_view(self.move_node, 'move_node')),
+            ),
+            url(
+                '^move/bulk/$',
+                self.admin_site.admin_view(
+                    self.timed_view(self.bulk_move_nodes, 'bulk_move_nodes')),
+            ),
+            url(
+                '^tree-children/$',
+                self.admin_site.admin_view(self.tree_children),
+                name='%s_%s_tree_children' % info
+            ),
+            url(
+                '^tree-json/$',
+                self.admin_site.admin_view(self.tree_json),
+                name='%s_%s_tree_json' % info
+            ),
+            url(
+                '^parent-candidates/$',
+                self.admin_site.admin_view(self.parent_candidates),
+                name='%s_%s_parent_candidates' % info
+            ),
             jsi18n_url,
         ]
         return new_urls + urls
 
+    def get_tree_path(self, request):
+        """
+        Return the node pks of the ``dag_path`` param. Raises KeyError when it
+        is missing and ValidationError when it is malformed.
+        """
+        from django_dag_admin.views import TREE_PATH_VAR
+
+        return [
+            str(self.model._meta.pk.to_python(node_id))
+            for node_id in request.GET[TREE_PATH_VAR].split('-')
+        ]
+
+    def tree_children(self, request):
+        """
+        Return the rendered rows of the children of the last node of the
+        ``dag_path`` param, used to expand the rows of a lazy tree.
+        """
+        from django_dag_admin.templatetags.admin_dag_tree import tree_children_results
+
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        try:
+            path = self.get_tree_path(request)
+        except (KeyError, ValidationError):
+            return HttpResponseBadRequest('Malformed path')
+        cl = self.get_changelist_instance(request, load_results=False)
+        return TemplateResponse(
+            request,
+            'admin/django_dag_admin/change_list_result_rows.html',
+            {'results': list(tree_children_results(cl, request, path))},
+        )
+
+    def tree_json(self, request):
+        """
+        Return, as JSON, the changelist rows in the compact form of
+        ``json_result_tree``, or the rows of the children of the last node of
+        the ``dag_path`` param when it is given.
+        """
+        from django_dag_admin.templatetags.admin_dag_tree import json_result_tree
+        from django_dag_admin.views import TREE_PATH_VAR
+
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        path = None
+        if TREE_PATH_VAR in request.GET:
+            try:
+                path = self.get_tree_path(request)
+            except ValidationError:
+                return HttpResponseBadRequest('Malformed path')
+        try:
+            # The children of a node are rendered without the changelist rows
+            cl = self.get_changelist_instance(request, load_results=path is None)
+        except IncorrectLookupParameters:
+            return HttpResponseBadRequest('Invalid lookup')
+        return JsonResponse(json_result_tree(cl, request, path))
+
+    def parent_candidates(self, request):
+        """
+        Return, as JSON, a page of the nodes matching the search ``term``
+        which can become a parent of the ``node`` without creating a cycle.
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        qs = self.get_node_queryset(request)
+        node_id = request.GET.get('node')
+        if node_id:
+            try:
+                node_id = self.model._meta.pk.to_python(node_id)
+            except ValidationError:
+                return HttpResponseBadRequest('Malformed node')
+            qs = qs.exclude(pk__in=RawSQL(*get_closure_sql(
+                self.model, [node_id], include_self=True)))
+        qs = self.search_parent_candidates(request, qs, request.GET.get('term', ''))
+        if not qs.ordered:
+            qs = qs.order_by('pk')
+        paginator = Paginator(qs, self.parent_candidates_per_page)
+        try:
+            page = paginator.page(request.GET.get('page') or 1)
+        except InvalidPage:
+            return HttpResponseBadRequest('Invalid page')
+        return JsonResponse({
+            'results': [
+                {'id': str(node.pk), 'text': str(node)}
+                for node in page.object_list
+            ],
+            'pagination': {'more': page.has_next()},
+        })
+
+    def search_parent_candidates(self, request, qs, term):
+        """
+        Return the nodes of ``qs`` matching ``term``, searched with the
+        admin's ``search_fields`` or, when it has none, on the text fields of
+        the node model.
+        """
+        if self.get_search_fields(request):
+            qs, may_have_duplicates = self.get_search_results(request, qs, term)
+            return qs.distinct() if may_have_duplicates else qs
+        if not term:
+            return qs
+        lookups = [
+            Q(**{'%s__icontains' % field.name: term})
+            for field in self.model._meta.concrete_fields
+            if isinstance(field, (CharField, TextField))
+        ]
+        if not lookups:
+            return qs.none()
+        query = Q()
+        for lookup in lookups:
+            query |= lookup
+        return qs.filter(query)
+
     def get_node(self, node_id):
         if node_id:
             return self.model.objects.get(pk=node_id)
@@ -138,75 +439,410 @@ class DjangoDagAdmin(admin.ModelAdmin):
         return None
 
     def validate_move(self, node, target,):
-        try:
-            self.model.circular_checker(target, node)
-        except ValidationError:
+        """
+        A move is valid unless ``target`` is ``node`` or one of its
+        descendants, checked with a single existence query.
+        """
+        if node.pk == target.pk:
             return False
-        return True
+        return not self.model._default_manager \
+            .filter(pk=target.pk) \
+            .filter(pk__in=RawSQL(*get_closure_sql(self.model, [node.pk]))) \
+            .exists()
 
     def move_node(self, request):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
         try:
-            node_id = request.POST['node_id']
-            sibling_id = request.POST['sibling_id']
-            node_parent_id = request.POST['node_parent_id']
-            sibling_parent_id = request.POST['sibling_parent_id']
-            as_child = bool(int(request.POST.get('as_child', 0)))
-            as_clone = bool(int(request.POST.get('as_clone', 0)))
-        except (KeyError, ValueError):
+            move = self.parse_move(request.POST)
+        except (KeyError, ValueError, ValidationError):
             # Some parameters were missing return a BadRequest
-            return HttpResponseBadRequest('Malformed POST params')
+            return self.move_response(request, _('Malformed POST params'), status=400)
+
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                # Lock the nodes involved, and the edges to the parents of
+                # the moved node, so concurrent editors queue up
+                nodes = self.model._default_manager.select_for_update().in_bulk({
+                    move['node_id'], move['node_parent_id'], move['target_id'],
+                    move['sibling_id'],
+                } - {None})
+                node = nodes.get(move['node_id'])
+                target = nodes.get(move['target_id'])
+                if node is None or (move['target_id'] is not None and target is None):
+                    return self.move_response(request, _('Invalid move'), status=400)
+                parent_edges = list(self.model.get_edge_model().objects
+                                    .select_for_update().filter(child_id=node.pk))
+                edge = next((
+                    parent_edge for parent_edge in parent_edges
+                    if parent_edge.parent_id == move['node_parent_id']
+                ), None)
+                if edge is not None:
+                    edge.child, edge.parent = node, nodes[edge.parent_id]
 
-        node = self.get_node(node_id)
-        target_id = sibling_id if as_child else sibling_parent_id
-        target = self.get_node(target_id)
-        edge = self.get_edge(node_parent_id, node_id)
+                if target is None:
+                    if len(parent_edges) > 1:
+                        return self.move_response(
+                            request, _('Node has too many parents'), status=400)
+                    if not edge:
+                        # No move needed
+                        return self.move_response(request, '')
+                    edge.delete()
+                elif not self.validate_move(node, target):
+                    return self.move_response(
+                        request,
+                        _('Invalid topological move, causes circular node paths'),
+                        status=400)
+                else:
+                    sibling_before = None
+                    if bool(node.sequence_manager):
+                        if move['sibling_id'] and not move['as_child']:
+                            sibling_before = nodes.get(move['sibling_id'])
+                        else:
+                            sibling_before = target.get_last_child()
+                    self.perform_move(node, target, edge, sibling_before, move['as_clone'])
+        except (ValidationError, IntegrityError):
+            return self.move_response(
+                request, _('Exception raised during move'), status=400)
+
+        if target is None:
+            msg = _('Move node "%(node)s" to root')
+        elif move['as_child']:
+            msg = _('Moved node "%(node)s" as child of "%(other)s"')
+        else:
+            msg = _('Moved node "%(node)s" as sibling of "%(other)s"')
+        return self.move_response(
+            request, msg % {'node': node, 'other': target},
+            node=node, target=target, target_path=move['target_path'],
+            old_parent_id=None if move['as_clone'] else move['node_parent_id'] or '')
 
-        if bool(node.sequence_manager):
-            if sibling_id and not as_child:
-                sibling_before = self.get_node(sibling_id)
+    def perform_move(self, node, target, edge, sibling_before=None, as_clone=False):
+        """
+        Attach ``node`` below ``target``, detaching it from the parent of
+        ``edge`` unless it is cloned.
+        """
+        if as_clone or edge is None:
+            if bool(node.sequence_manager):
+                target.insert_child_after(node, sibling_before)
             else:
-                sibling_before = target.get_last_child()
-        try:
-            if target is None or self.validate_move(node, target):
+                target.add_child(node)
+        elif bool(node.sequence_manager):
+            edge.child.move_node(
+                edge.parent, target, sibling_before,
+                position=Position.AFTER if sibling_before else Position.LAST)
+        else:
+            edge.child.move_node(edge.parent, target)
+
+    def parse_move(self, params):
+        """
+        Convert the params of a single move, as posted to move_node, to a
+        dict of node pks and flags.
+        """
+        to_python = self.model._meta.pk.to_python
+
+        def pk_or_none(value):
+            return None if value in ('', None) else to_python(value)
+
+        as_child = bool(int(params.get('as_child', 0)))
+        sibling_id = pk_or_none(params['sibling_id'])
+        return {
+            'node_id': to_python(params['node_id']),
+            'node_parent_id': pk_or_none(params['node_parent_id']),
+            'sibling_id': sibling_id,
+            'target_id': sibling_id if as_child else pk_or_none(params['sibling_parent_id']),
+            'as_child': as_child,
+            'as_clone': bool(int(params.get('as_clone', 0))),
+            'target_path': str(params.get('target_path', '')),
+        }
+
+    def plan_moves(self, moves):
+        """
+        Validate each of the parsed ``moves`` against the graph as left by the
+        earlier ones. Only the edges reachable from the moved nodes can make a
+        move circular, so they are fetched in one query and the moves are
+        replayed on them in memory.
+
+        Returns the nodes involved, the fetched ``{(parent, child): edge_id}``
+        edges, the resulting set of ``(parent, child)`` edges and a result
+        dict for each move. The nodes and edges are locked, so this must run
+        in the transaction applying the moves.
+        """
+        node_ids = set(move['node_id'] for move in moves)
+        # Lock the nodes and edges involved so concurrent editors queue up
+        nodes = self.model._default_manager.select_for_update().in_bulk(
+            (
+                node_ids |
+                set(move['target_id'] for move in moves) |
+                set(move['sibling_id'] for move in moves)
+            ) - {None}
+        )
+        edges = {
+            (parent_id, child_id): edge_id
+            for edge_id, parent_id, child_id in self.model.get_edge_model().objects
+            .select_for_update()
+            .filter(
+                Q(parent_id__in=RawSQL(*get_closure_sql(self.model, node_ids, include_self=True))) |
+                Q(child_id__in=node_ids)
+            )
+            .values_list('pk', 'parent_id', 'child_id')
+        }
+        graph = set(edges)
+        children = defaultdict(set)
+        parents = defaultdict(set)
+        for parent_id, child_id in graph:
+            children[parent_id].add(child_id)
+            parents[child_id].add(parent_id)
+
+        def reaches(source, destination):
+            seen = set()
+            pending = [source]
+            while pending:
+                for child_id in children[pending.pop()]:
+                    if child_id == destination:
+                        return True
+                    if child_id not in seen:
+                        seen.add(child_id)
+                        pending.append(child_id)
+            return False
+
+        def remove(edge):
+            graph.discard(edge)
+            children[edge[0]].discard(edge[1])
+            parents[edge[1]].discard(edge[0])
+
+        def add(edge):
+            graph.add(edge)
+            children[edge[0]].add(edge[1])
+            parents[edge[1]].add(edge[0])
+
+        results = []
+        for move in moves:
+            node = nodes.get(move['node_id'])
+            target = nodes.get(move['target_id'])
+            result = {
+                'status': 'OK',
+                'node_id': str(move['node_id']),
+                'old_parent_id': '' if move['as_clone'] else str(move['node_parent_id'] or ''),
+                'target_id': '' if target is None else str(target.pk),
+                'target_path': '' if target is None else move['target_path'],
+                'as_clone': move['as_clone'],
+            }
+            old_edge = (move['node_parent_id'], move['node_id'])
+            if node is None or (move['target_id'] is not None and target is None):
+                result.update(status='error', message=_('Invalid move'))
+            elif target is None:
+                if len(parents[node.pk]) > 1:
+                    result.update(status='error', message=_('Node has too many parents'))
+                elif old_edge in graph:
+                    remove(old_edge)
+                    result['message'] = _('Move node "%(node)s" to root') % {'node': node}
+                else:
+                    result['message'] = ''
+            elif target.pk == node.pk or reaches(node.pk, target.pk):
+                result.update(
+                    status='error',
+                    message=_('Invalid topological move, causes circular node paths'))
+            else:
+                if not move['as_clone'] and old_edge in graph:
+                    remove(old_edge)
+                add((target.pk, node.pk))
+                if move['as_child']:
+                    msg = _('Moved node "%(node)s" as child of "%(other)s"')
+                else:
+                    msg = _('Moved node "%(node)s" as sibling of "%(other)s"')
+                result['message'] = msg % {'node': node, 'other': target}
+            result['message'] = str(result['message'])
+            results.append(result)
+        return nodes, edges, graph, results
+
+    def apply_moves(self, moves, nodes, edges, graph):
+        """
+        Apply validated moves. Without a sequence manager the net change to
+        the edges is applied with one bulk delete and one bulk insert,
+        otherwise each move goes through the ordering API.
+        """
+        edge_model = self.model.get_edge_model()
+        if self.model.sequence_manager:
+            for move in moves:
+                node = nodes[move['node_id']]
+                target = nodes.get(move['target_id'])
+                edge = self.get_edge(move['node_parent_id'], move['node_id'])
                 if target is None:
-                    if node.parents.count() > 1:
-                        messages.error(request, _('Node has too many parents'))
-                        return HttpResponseBadRequest('Too many parents')
-                    elif edge:
-                        messages.info(
-                            request,
-                            _('Move node "%(node)s" to root' % {'node': node}))
+                    if edge:
                         edge.delete()
-                        return HttpResponse('OK')
-                    # No move needed
-                    return HttpResponse('OK')
-                if as_clone or edge is None:
-                    if bool(node.sequence_manager):
-                        target.insert_child_after(node, sibling_before)
-                    else:
-                        target.add_child(node)
-                elif edge:
-                    if bool(node.sequence_manager):
-                        edge.child.move_node(
-                            edge.parent, target, sibling_before,
-                            position=Position.AFTER if sibling_before else Position.LAST)
-                    else:
-                        edge.child.move_node(edge.parent, target)
+                    continue
+                if move['sibling_id'] and not move['as_child']:
+                    sibling_before = nodes[move['sibling_id']]
                 else:
-                    messages.error(request, _('Invalid move'))
-                    return HttpResponseBadRequest('Invalid move')
+                    sibling_before = target.get_last_child()
+                self.perform_move(node, target, edge, sibling_before, move['as_clone'])
+            return
+
+        removed = [edge_id for edge, edge_id in edges.items() if edge not in graph]
+        added = [edge for edge in graph if edge not in edges]
+        if removed:
+            edge_model.objects.filter(pk__in=removed).delete()
+        if added:
+            edge_model.objects.bulk_create([
+                edge_model(parent_id=parent_id, child_id=child_id)
+                for parent_id, child_id in added
+            ])
+            # bulk_create sends no signals, notify as the m2m manager would
+            added_children = defaultdict(set)
+            for parent_id, child_id in added:
+                added_children[parent_id].add(child_id)
+            for parent_id, child_ids in added_children.items():
+                m2m_changed.send(
+                    sender=self.model.children.through, action='post_add',
+                    instance=nodes.get(parent_id) or self.model(pk=parent_id),
+                    reverse=False, model=self.model, pk_set=child_ids,
+                    using=router.db_for_write(edge_model))
+
+    def bulk_move_nodes(self, request):
+        """
+        Apply a list of moves, each with the params of move_node, in a single
+        transaction. Every move is checked up front and nothing is moved
+        unless all of them are valid; the response reports on each move.
+        """
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        try:
+            if request.content_type == 'application/json':
+                moves = json.loads(request.body.decode('utf-8'))['moves']
             else:
-                messages.error(request, _('Invalid topological move, causes circular node paths'))
-                return HttpResponseBadRequest('Invalid move')
-        except Exception:
-            return HttpResponseBadRequest('Exception raised during move')
+                moves = json.loads(request.POST['moves'])
+            if not isinstance(moves, list) or \
+                    not all(isinstance(move, dict) for move in moves):
+                raise ValueError('moves must be a list of objects')
+            moves = [self.parse_move(move) for move in moves]
+        except (KeyError, ValueError, TypeError, ValidationError):
+            return JsonResponse(
+                {'status': 'error', 'message': str(_('Malformed POST params'))},
+                status=400)
 
-        if as_child:
-            msg = _('Moved node "%(node)s" as child of "%(other)s"')
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                nodes, edges, graph, results = self.plan_moves(moves)
+                if any(result['status'] != 'OK' for result in results):
+                    return JsonResponse({
+                        'status': 'error',
+                        'message': str(_('Invalid moves, no node was moved')),
+                        'results': results,
+                    }, status=400)
+                self.apply_moves(moves, nodes, edges, graph)
+        except (ValidationError, IntegrityError):
+            return JsonResponse(
+                {'status': 'error', 'message': str(_('Exception raised during move'))},
+                status=400)
+
+        edge_ids = {
+            (parent_id, child_id): edge_id
+            for edge_id, parent_id, child_id in self.model.get_edge_model().objects
+            .filter(child_id__in=set(move['node_id'] for move in moves))
+            .values_list('pk', 'parent_id', 'child_id')
+        }
+        for move, result in zip(moves, results):
+            result['edge_id'] = edge_ids.get((move['target_id'], move['node_id']))
+
+        # Only the rows below the targets are rendered, not the changelist
+        cl = self.get_changelist_instance(request, load_results=False)
+        rendered = []
+        targets = {}
+        for move in moves:
+            targets.setdefault((move['target_id'], move['target_path']), []).append(
+                nodes[move['node_id']])
+        for (target_id, target_path), moved in targets.items():
+            target_path, rows = self.render_moved_rows(
+                request, cl, nodes.get(target_id), target_path, moved)
+            rendered.append({
+                'target_id': '' if target_id is None else str(target_id),
+                'target_path': target_path,
+                'rows': rows,
+            })
+        return JsonResponse({
+            'status': 'OK',
+            'message': '',
+            'results': results,
+            'rendered': rendered,
+        })
+
+    def move_response(self, request, message, status=200, node=None,
+                      target=None, target_path='', old_parent_id=None):
+        """
+        Return the JSON describing the outcome of a move. For a successful
+        move it holds the moved node, the parent it was removed from and the
+        re-rendered rows below the target path, so the changelist can be
+        patched in place.
+        """
+        data = {
+            'status': 'OK' if status == 200 else 'error',
+            'message': str(message),
+        }
+        if node is not None and status == 200:
+            data.update(self.get_moved_rows(request, node, target, target_path))
+            data.update({
+                'node_id': str(node.pk),
+                'old_parent_id': '' if old_parent_id is None else str(old_parent_id),
+                'target_id': '' if target is None else str(target.pk),
+                'as_clone': old_parent_id is None,
+            })
+        return JsonResponse(data, status=status)
+
+    def get_moved_rows(self, request, node, target, target_path):
+        """
+        Render the rows that now sit below ``target_path``, the moved node as
+        a root when there is no target. The rows of deeper levels are lazy.
+        """
+        cl = self.get_changelist_instance(request, load_results=False)
+        target_path, rows = self.render_moved_rows(request, cl, target, target_path, [node])
+        edge = self.get_edge(target.pk, node.pk) if target else None
+        return {
+            'target_path': target_path,
+            'edge_id': edge.pk if edge else None,
+            'rows': rows,
+        }
+
+    def render_moved_rows(self, request, cl, target, target_path, moved):
+        """
+        Return the target path and the rendered rows of the children of
+        ``target``, or of the ``moved`` nodes as roots when there is no
+        target. The rows are ``None`` when the target path does not lead to
+        ``target``.
+        """
+        from django_dag_admin.templatetags.admin_dag_tree import (
+            tree_children_results, tree_node_results
+        )
+
+        if target is None:
+            nodes = cl.get_node_results(request, [node.pk for node in moved])
+            rows = tree_node_results(
+                cl, request, [],
+                [(nodes[node.pk], None) for node in moved if node.pk in nodes])
+            target_path = ''
         else:
-            msg = _('Moved node "%(node)s" as sibling of "%(other)s"')
-        messages.info(request, msg % {'node': node, 'other': target})
-        return HttpResponse('OK')
+            path = target_path.split('-') if target_path else []
+            if not path or path[-1] != str(target.pk):
+                return None, None
+            rows = tree_children_results(cl, request, path)
+        return target_path, render_to_string(
+            'admin/django_dag_admin/change_list_result_rows.html',
+            {'results': list(rows)}, request)
+
+
+class DagEdgeInlineMixin:
+    """
+    Mixin for the inlines listed in ``DjangoDagAdmin.edges_admin``, selecting
+    the parent node with a searchable widget backed by the node admin rather
+    than rendering every node of the graph.
+    """
+    form = MoveEdgeForm
+    formset = DjangoDagAdminFormSet
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'parent' and 'widget' not in kwargs:
+            kwargs['widget'] = DagParentSelect(
+                db_field.remote_field.model, self.admin_site)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 def admin_factory(form_class):
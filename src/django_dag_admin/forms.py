@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 """Forms for Django-Dag Models"""
 
+from collections import defaultdict
 from django import forms
-from django.db.models import Count
 from django.core.exceptions import ValidationError
 from django.forms.models import ErrorList
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
-from django_dag_admin.utils import get_nodedepth
+from django_dag_admin.utils.graph import get_closure_pks
+from django_dag_admin.widgets import DagParentSelect
 
 
 class BaseDagMoveForm(forms.ModelForm):
@@ -17,20 +18,24 @@ class BaseDagMoveForm(forms.ModelForm):
         return '&nbsp;&nbsp;&nbsp;&nbsp;' * (level - 1)
 
     @classmethod
-    def add_subtree(cls, for_node, node, options):
-        """Recursively build options tree."""
-        try:
-            if for_node:
-                node._meta.model.circular_checker(node, for_node)
-        except ValidationError:
-            # Catch ValidationError ie The object is an ancestor or it's self
-            pass
-        else:
+    def add_subtree(cls, node, depth, options, nodes, children, excluded):
+        """
+        Build the options tree below ``node`` from the in memory adjacency
+        list, walking it with an explicit stack so deep graphs don't hit the
+        recursion limit.
+        """
+        stack = [(node, depth)]
+        while stack:
+            node, depth = stack.pop()
+            if node.pk in excluded:
+                # The node is the one being moved or one of it's descendants
+                continue
             options.append(
                 (node.pk,
-                mark_safe(cls.mk_indent(get_nodedepth(node)) + escape(node))))
-            for subnode in node.children.all():
-                cls.add_subtree(for_node, subnode, options)
+                mark_safe(cls.mk_indent(depth) + escape(node))))
+            stack.extend(
+                (nodes[child_pk], depth + 1)
+                for child_pk in reversed(children.get(node.pk, ())))
 
     @classmethod
     def mk_dropdown_tree(cls, model, for_node=None, for_edge=None):
@@ -40,10 +45,25 @@ class BaseDagMoveForm(forms.ModelForm):
         if for_node is None and for_edge:
             for_node = for_edge.child
 
-        for node in model.objects.annotate(
-                Count('parents')
-        ).filter(parents__count=0):
-            cls.add_subtree(for_node, node, options)
+        excluded = set()
+        if for_node:
+            excluded = get_closure_pks(model, [for_node.pk], include_self=True)
+
+        nodes = list(model.objects.all())
+        position = {node.pk: idx for idx, node in enumerate(nodes)}
+        nodes = {node.pk: node for node in nodes}
+        children = defaultdict(list)
+        for parent_id, child_id in model.get_edge_model().objects \
+                .values_list('parent_id', 'child_id'):
+            children[parent_id].append(child_id)
+        has_parents = set()
+        for child_pks in children.values():
+            child_pks.sort(key=position.__getitem__)
+            has_parents.update(child_pks)
+
+        for pk, node in nodes.items():
+            if pk not in has_parents:
+                cls.add_subtree(node, 0, options, nodes, children, excluded)
         return options
 
 
@@ -70,6 +90,12 @@ class MoveEdgeForm(BaseDagMoveForm):
             label_suffix=label_suffix, empty_permitted=empty_permitted,
             instance=instance, **kwargs)
 
+        parent_field = self.fields.get('parent')
+        if parent_object is not None and parent_field is not None and \
+                isinstance(parent_field.widget, DagParentSelect):
+            # Candidate parents must not be the node or its descendants
+            parent_field.widget.for_node = parent_object.pk
+
     def clean(self):
         cleaned_data = super().clean()
         parent = cleaned_data.get('parent')
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django_dag_admin.utils.counters import has_edge_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the children/parents counters of dag nodes using DagCounterMixin.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', metavar='app_label.ModelName',
+            help='The node models to rebuild, all the models using the mixin by default.')
+
+    def handle(self, *args, **options):
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as e:
+                raise CommandError(e)
+        else:
+            models = [model for model in apps.get_models() if has_edge_counters(model)]
+        for model in models:
+            if not has_edge_counters(model):
+                raise CommandError('%s does not use DagCounterMixin' % model._meta.label)
+            updated = rebuild_counters(model)
+            self.stdout.write('Rebuilt counters of %d %s nodes' % (updated, model._meta.label))
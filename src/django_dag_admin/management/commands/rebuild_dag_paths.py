@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached root to node paths of dag path cache models.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='+', metavar='app_label.ModelName',
+            help='The path cache models, built with path_cache_factory, to rebuild.')
+
+    def handle(self, *args, **options):
+        try:
+            models = [apps.get_model(label) for label in options['models']]
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        for model in models:
+            if not hasattr(model, 'annotate_paths'):
+                raise CommandError('%s is not a dag path cache' % model._meta.label)
+            model.rebuild()
+            self.stdout.write('Rebuilt %d %s paths' % (
+                model._default_manager.count(), model._meta.label))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from django.db import models, router, transaction
+from django.db.models import signals
+
+
+class DagCounterMixin(models.Model):
+    """
+    Node mixin storing the number of children and parents of each node, so
+    the changelist can read them instead of aggregating the edge table.
+    The counters are kept up to date by the signals connected with
+    ``django_dag_admin.utils.counters.connect_counters``, which
+    ``DjangoDagAdmin`` does for its model, and can be rebuilt with the
+    ``rebuild_dag_counters`` management command.
+    """
+    children_count = models.PositiveIntegerField(default=0, editable=False)
+    parents_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+def path_cache_factory(node_model, edge_model, padsize=None, padchar=None, sepchar=None,
+                       max_length=1024):
+    """
+    Return an abstract model caching one row per root to node path of
+    ``node_model``, with the annotations ``with_sort_sequence`` computes, so
+    the tree layout is read with an indexed scan instead of a recursive
+    query. The sort settings default to those of the node queryset.
+
+    Set the concrete model as ``DjangoDagAdmin.path_cache_model``, the
+    admin connects the signals rebuilding the rows of the nodes below a
+    changed edge. ``rebuild()`` fills the whole table.
+    """
+    class DagPathCacheBase(models.Model):
+        node = models.ForeignKey(
+            node_model, related_name='dag_paths', on_delete=models.CASCADE)
+        edge = models.ForeignKey(
+            edge_model, related_name='+', null=True, blank=True, on_delete=models.CASCADE)
+        depth = models.PositiveIntegerField()
+        node_path = models.CharField(max_length=max_length)
+        pk_path = models.CharField(max_length=max_length, db_index=True)
+        sequence_path = models.CharField(max_length=max_length, db_index=True, null=True)
+
+        class Meta:
+            abstract = True
+
+        @classmethod
+        def get_sort_settings(cls):
+            qs = node_model._default_manager.all()
+            return {
+                'padsize': padsize or qs.path_padding_size,
+                'padchar': padchar or qs.path_padding_char,
+                'sepchar': sepchar or qs.path_seperator,
+            }
+
+        @classmethod
+        def annotate_paths(cls, queryset):
+            """
+            Annotate ``queryset`` as ``with_sort_sequence`` does, one row per
+            cached path. Nodes without cached paths are left out.
+            """
+            return queryset.annotate(
+                dag_node_path=models.F('dag_paths__node_path'),
+                dag_pk_path=models.F('dag_paths__pk_path'),
+                dag_sequence_path=models.F('dag_paths__sequence_path'),
+                dag_path_depth=models.F('dag_paths__depth'),
+            ).filter(dag_node_path__isnull=False)
+
+        @classmethod
+        def rebuild(cls, pks=None):
+            """
+            Replace the cached paths ending at the nodes with the given
+            ``pks``, or every path.
+            """
+            settings = cls.get_sort_settings()
+            nodes = node_model._default_manager.with_sort_sequence(**settings)
+            rows = cls._default_manager.all()
+            if pks is not None:
+                nodes = nodes.filter(pk__in=pks)
+                rows = rows.filter(node_id__in=pks)
+            paths = [
+                (pk, node_path, pk_path, sequence_path, node_path.split(settings['sepchar']))
+                for pk, node_path, pk_path, sequence_path in nodes.values_list(
+                    'pk', 'dag_node_path', 'dag_pk_path', 'dag_sequence_path')
+            ]
+            pairs = set((parts[-2], parts[-1]) for *_, parts in paths if len(parts) > 1)
+            edges = {}
+            if pairs:
+                parent_ids, child_ids = zip(*pairs)
+                edges = {
+                    (str(parent_id), str(child_id)): edge_id
+                    for parent_id, child_id, edge_id in edge_model.objects.filter(
+                        parent_id__in=set(parent_ids), child_id__in=set(child_ids)
+                    ).values_list('parent_id', 'child_id', 'pk')
+                }
+            with transaction.atomic(using=router.db_for_write(cls)):
+                rows.delete()
+                cls._default_manager.bulk_create(
+                    cls(
+                        node_id=pk,
+                        edge_id=edges.get(tuple(parts[-2:])) if len(parts) > 1 else None,
+                        depth=len(parts) - 1,
+                        node_path=node_path,
+                        pk_path=pk_path,
+                        sequence_path=sequence_path,
+                    )
+                    for pk, node_path, pk_path, sequence_path, parts in paths
+                )
+
+        @classmethod
+        def rebuild_below(cls, pks):
+            """Rebuild the cached paths of the given nodes and their descendants"""
+            from .utils.graph import get_closure_pks
+            cls.rebuild(get_closure_pks(node_model, pks, include_self=True))
+
+        @classmethod
+        def connect(cls):
+            """Keep the cached paths in step with node and edge changes"""
+            uid = 'django_dag_admin:paths:%s' % cls._meta.label_lower
+
+            def node_saved(instance, created, raw=False, **kwargs):
+                if created and not raw:
+                    cls.rebuild([instance.pk])
+
+            def edge_changed(instance, raw=False, **kwargs):
+                if not raw:
+                    cls.rebuild_below([instance.child_id])
+
+            def edges_changed(instance, action, reverse, pk_set, **kwargs):
+                if action == 'pre_clear' and not reverse:
+                    instance._dag_cleared_path_pks = set(
+                        instance.children.values_list('pk', flat=True))
+                elif action in ('post_add', 'post_remove'):
+                    cls.rebuild_below([instance.pk] if reverse else pk_set)
+                elif action == 'post_clear':
+                    pks = {instance.pk} if reverse else getattr(
+                        instance, '_dag_cleared_path_pks', set())
+                    cls.rebuild_below(pks)
+
+            signals.post_save.connect(
+                node_saved, sender=node_model, weak=False, dispatch_uid=uid)
+            signals.post_save.connect(
+                edge_changed, sender=edge_model, weak=False, dispatch_uid=uid)
+            signals.post_delete.connect(
+                edge_changed, sender=edge_model, weak=False, dispatch_uid=uid)
+            signals.m2m_changed.connect(
+                edges_changed, sender=node_model.children.through, weak=False,
+                dispatch_uid=uid)
+
+    return DagPathCacheBase
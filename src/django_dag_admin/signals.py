@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from django.dispatch import Signal
+
+
+# Sent as each timed phase of an instrumented request ends, with the
+# ``request``, the ``phase`` name, its ``duration`` in seconds and the
+# number of ``queries`` it ran. The sender is the node model.
+phase_timed = Signal()
@@ -0,0 +1,32 @@
+(function ($) {
+    'use strict';
+    // Binds select2 to the DagParentSelect widgets, candidates are loaded
+    // from the admin page by page, excluding the descendants of the node
+    var init = function ($element) {
+        $element.select2({
+            ajax: {
+                delay: 250,
+                data: function (params) {
+                    return {
+                        term: params.term,
+                        page: params.page,
+                        node: $element.attr('data-dag-node')
+                    };
+                }
+            }
+        });
+    };
+
+    $(document).ready(function () {
+        $('.dag-parent-select').not('[name*=__prefix__]').each(function () {
+            init($(this));
+        });
+    });
+
+    $(document).on('formset:added', function (event, $row) {
+        $row = $row ? $($row) : $(event.target);
+        $row.find('.dag-parent-select').each(function () {
+            init($(this));
+        });
+    });
+})(django.jQuery);
@@ -11,6 +11,83 @@
 
     RECENTLY_FADE_DURATION = 2000;
 
+// The rows of the table, indexed once so tree operations don't query the DOM
+    var index = {
+        rows: {},      // row id -> row
+        children: {},  // row id -> rows below it on its path
+        parents: {},   // parent id -> rows below any row of the parent
+        nodes: {}      // node id -> rows of the node
+    };
+
+    var parent_row_id = function (elem) {
+        return elem.id.split('-').slice(0, -1).join('-');
+    };
+
+    var index_add = function (map, key, elem) {
+        (map[key] = map[key] || []).push(elem);
+    };
+
+    var index_remove = function (map, key, elem) {
+        var rows = map[key] || [];
+        var position = rows.indexOf(elem);
+        if (position !== -1) {
+            rows.splice(position, 1);
+        }
+    };
+
+    var index_rows = function (elems) {
+        $.each(elems, function (i, elem) {
+            if (!elem.id) {
+                // Label rows aren't part of the tree
+                return;
+            }
+            index.rows[elem.id] = elem;
+            index_add(index.children, parent_row_id(elem), elem);
+            index_add(index.parents, elem.getAttribute('parent'), elem);
+            index_add(index.nodes, elem.getAttribute('node'), elem);
+        });
+    };
+
+    var unindex_rows = function (elems) {
+        $.each(elems, function (i, elem) {
+            if (!elem.id || index.rows[elem.id] !== elem) {
+                return;
+            }
+            delete index.rows[elem.id];
+            index_remove(index.children, parent_row_id(elem), elem);
+            index_remove(index.parents, elem.getAttribute('parent'), elem);
+            index_remove(index.nodes, elem.getAttribute('node'), elem);
+        });
+    };
+
+    var descendant_rows = function (elem, by_node) {
+        // The rows below elem on its path or, by_node, below any row of its
+        // node and so on. Each row is visited once.
+        var found = [], seen = {}, seen_nodes = {}, stack = [elem];
+        while (stack.length) {
+            var row = stack.pop();
+            var below;
+            if (by_node) {
+                var node_id = row.getAttribute('node');
+                if (seen_nodes[node_id]) {
+                    continue;
+                }
+                seen_nodes[node_id] = true;
+                below = index.parents[node_id];
+            } else {
+                below = index.children[row.id];
+            }
+            $.each(below || [], function (i, child) {
+                if (!seen[child.id]) {
+                    seen[child.id] = true;
+                    found.push(child);
+                    stack.push(child);
+                }
+            });
+        }
+        return found;
+    };
+
 // This is the basic Node class, which handles UI tree operations for each 'row'
     var Node = function (elem) {
         var $elem = $(elem);
@@ -41,27 +118,60 @@
             is_collapsed: function () {
                 return $elem.find('a.collapse').hasClass('collapsed');
             },
+            is_lazy: function () {
+                // Children of lazy rows have not been fetched yet
+                return $elem.find('a.collapse').hasClass('lazy');
+            },
+            load_children: function (done) {
+                // Fetch the rendered children rows and insert them below
+                $elem.find('a.collapse').removeClass('lazy');
+                $.ajax({
+                    url: window.TREE_CHILDREN_ENDPOINT,
+                    data: {dag_path: $elem.attr('id').substring('path-'.length)},
+                    success: function (html) {
+                        var $rows = $($.parseHTML($.trim(html))).filter('tr');
+                        if ($('#drag-enable').val() === "1") {
+                            $rows.find('td.drag-handler span').addClass('active');
+                        }
+                        $rows.insertAfter($elem);
+                        index_rows($rows.get());
+                        done();
+                    },
+                    error: function () {
+                        $elem.find('a.collapse').addClass('lazy');
+                    }
+                });
+            },
             children: function (all_nodes) {
-                if (all_nodes==false){
-                    return $('tr[id^="' + path + '-'+node_id+'-"]');
+                // The rows right below this one or, all_nodes, below any row
+                // of this node
+                if (!all_nodes){
+                    return $(index.children[elem.id] || []);
                 } else {
-                    return $('tr[parent=' + node_id + ']');
+                    return $(index.parents[node_id] || []);
                 }
             },
+            descendants: function (all_nodes) {
+                return $(descendant_rows(elem, all_nodes));
+            },
             collapse: function (as_clone) {
-                // For each children, hide it's childrens and so on...
-                $.each(this.children(as_clone),function () {
-                    var node = new Node(this);
-                    node.collapse(as_clone);
-                }).hide();
+                // Hide the childrens, their childrens and so on...
+                var $descendants = this.descendants(as_clone).hide();
                 // Swicth class to set the proprt expand/collapse icon
-                $elem.find('a.collapse').removeClass('expanded').addClass('collapsed');
+                $descendants.add($elem).find('a.collapse').removeClass('expanded').addClass('collapsed');
             },
             parent_node: function () {
                 // Returns a Node object of the parent
-                return new Node($('tr[id$=' + parent_id + ']', $elem.parent())[0]);
+                return new Node(index.rows[path]);
             },
             expand: function (as_clone) {
+                if (this.is_lazy()) {
+                    var node = this;
+                    this.load_children(function () {
+                        node.expand(as_clone);
+                    });
+                    return;
+                }
                 // Display each kid (will display in collapsed state)
                 this.children(as_clone).show();
                 // Swicth class to set the proprt expand/collapse icon
@@ -83,6 +193,205 @@
         }
     };
 
+// Renders the rows of a compact tree, only the rows in view are kept in the DOM
+    var VirtualTree = function ($table, data) {
+        var COLLAPSE_NONE = 0, COLLAPSE_LAZY = 2;
+        var BUFFER_ROWS = 20;
+        var $tbody = $table.find('tbody.virtual-rows');
+        var colspan = $table.find('thead th').length;
+        var markup = data.markup;
+        var nodes = data.nodes;
+        var fields = {};
+        $.each(data.fields, function (i, name) {
+            fields[name] = i;
+        });
+        var entries = [];   // labels and rows, in table order
+        var visible = [];   // the entries not hidden by a collapsed row
+        var by_id = {};
+        var collapsed = {}; // row id -> true
+        var row_height = null;
+        var frame = null;
+
+        var escape = function (value) {
+            return String(value === null ? '' : value)
+                .replace(/&/g, '&amp;').replace(/"/g, '&quot;').replace(/</g, '&lt;');
+        };
+
+        var to_entries = function (rows) {
+            var added = [];
+            $.each(rows, function (i, row) {
+                if (row[fields.label]) {
+                    added.push({label: row[fields.label]});
+                }
+                var entry = {
+                    id: 'path-' + row[fields.path],
+                    node: row[fields.node],
+                    parent: row[fields.parent],
+                    depth: row[fields.depth],
+                    children: row[fields.children],
+                    edge: row[fields.edge],
+                    collapse: row[fields.collapse],
+                    path: row[fields.path],
+                    loaded: row[fields.collapse] !== COLLAPSE_LAZY
+                };
+                if (!entry.loaded) {
+                    collapsed[entry.id] = true;
+                }
+                by_id[entry.id] = entry;
+                added.push(entry);
+            });
+            return added;
+        };
+
+        var collapse_markup = function (entry) {
+            if (entry.collapse === COLLAPSE_NONE) {
+                return markup.collapse.none;
+            } else if (!entry.loaded) {
+                return markup.collapse.lazy;
+            }
+            return collapsed[entry.id] ? markup.collapse.collapsed : markup.collapse.expanded;
+        };
+
+        var render_row = function (entry, row_class) {
+            var html = [
+                '<tr id="', escape(entry.id), '" class="', row_class,
+                '" level="', escape(entry.depth), '" children-num="', escape(entry.children),
+                '" parent="', escape(entry.parent), '" node="', escape(entry.node),
+                '" edge="', escape(entry.edge), '">'
+            ];
+            var first = true;
+            $.each(nodes[entry.node] || [], function (i, cell) {
+                if (cell[1] === null) {
+                    html.push(cell[0]);
+                    return;
+                }
+                html.push(
+                    first ? markup.drag_handler : '', cell[0],
+                    new Array((first ? entry.depth || 0 : 0) + 1).join(markup.spacer),
+                    ' ', collapse_markup(entry), cell[1]);
+                first = false;
+            });
+            html.push('</tr>');
+            return html.join('');
+        };
+
+        var spacer_row = function (height) {
+            return '<tr class="virtual-spacer"><td colspan="' + colspan +
+                '" style="height: ' + height + 'px; padding: 0; border: 0;"></td></tr>';
+        };
+
+        var render = function () {
+            frame = null;
+            var height = row_height || 30;
+            var top = $tbody.offset().top;
+            var first = Math.max(0, Math.floor(($(window).scrollTop() - top) / height) - BUFFER_ROWS);
+            var last = Math.min(
+                visible.length, first + Math.ceil($(window).height() / height) + 2 * BUFFER_ROWS);
+            var html = [spacer_row(first * height)];
+            for (var i = first; i < last; i++) {
+                var entry = visible[i];
+                html.push(entry.label !== undefined ?
+                    entry.label : render_row(entry, i % 2 ? 'row2' : 'row1'));
+            }
+            html.push(spacer_row((visible.length - last) * height));
+            $tbody.html(html.join(''));
+            if (row_height === null && last > first) {
+                // The rows are assumed to share the height of the first one
+                row_height = $tbody.children('tr[id]').first().outerHeight() || height;
+                if (row_height !== height) {
+                    render();
+                }
+            }
+        };
+
+        var schedule = function () {
+            if (frame === null) {
+                frame = window.requestAnimationFrame(render);
+            }
+        };
+
+        var refresh = function () {
+            // Drop the rows below collapsed rows, rows come in path order so
+            // these are the deeper rows that follow them
+            var hidden_below = null;
+            visible = [];
+            $.each(entries, function (i, entry) {
+                if (entry.label !== undefined) {
+                    hidden_below = null;
+                } else if (hidden_below !== null && entry.depth > hidden_below) {
+                    return;
+                } else {
+                    hidden_below = collapsed[entry.id] ? entry.depth : null;
+                }
+                visible.push(entry);
+            });
+            schedule();
+        };
+
+        var load_children = function (entry) {
+            entry.loaded = true;
+            $.ajax({
+                url: window.TREE_JSON_ENDPOINT,
+                data: {dag_path: entry.path},
+                dataType: 'json',
+                success: function (children) {
+                    $.extend(nodes, children.nodes);
+                    var added = to_entries(children.attached);
+                    entries.splice.apply(entries, [entries.indexOf(entry) + 1, 0].concat(added));
+                    delete collapsed[entry.id];
+                    refresh();
+                },
+                error: function () {
+                    entry.loaded = false;
+                }
+            });
+        };
+
+        if (data.attached_label) {
+            entries.push({label: data.attached_label});
+        }
+        entries = entries.concat(to_entries(data.attached), to_entries(data.detached));
+        $(window).on('scroll resize', schedule);
+        refresh();
+
+        return {
+            toggle: function (id) {
+                var entry = by_id[id];
+                if (entry === undefined) {
+                    return;
+                }
+                if (!entry.loaded) {
+                    load_children(entry);
+                    return;
+                }
+                if (collapsed[id]) {
+                    delete collapsed[id];
+                } else {
+                    collapsed[id] = true;
+                }
+                refresh();
+            },
+            expand_all: function () {
+                // Lazy rows stay collapsed, their children haven't been fetched
+                collapsed = {};
+                $.each(entries, function (i, entry) {
+                    if (entry.label === undefined && !entry.loaded) {
+                        collapsed[entry.id] = true;
+                    }
+                });
+                refresh();
+            },
+            collapse_all: function () {
+                $.each(entries, function (i, entry) {
+                    if (entry.label === undefined && entry.collapse !== COLLAPSE_NONE) {
+                        collapsed[entry.id] = true;
+                    }
+                });
+                refresh();
+            }
+        };
+    };
+
     $(document).ready(function () {
 
         // begin csrf token code
@@ -112,43 +421,286 @@
         // end csrf token code
         $body = $('body');
 
+        var show_message = function (level, text) {
+            // Add a message to the admin's message list
+            if (!text) {
+                return;
+            }
+            var $list = $('ul.messagelist');
+            if (!$list.length) {
+                $list = $('<ul class="messagelist"></ul>').insertBefore('#content');
+            }
+            $('<li></li>').addClass(level).text(text).appendTo($list);
+        };
+
+        var fade_out = function () {
+            $(this).animate({
+                backgroundColor: RECENTLY_MOVED_FADEOUT
+            }, RECENTLY_FADE_DURATION, function () {
+                this.removeAttribute('style');
+            });
+        };
+
+        var highlight_moved = function ($row, node_id) {
+            // Flash the moved row, and the other rows of the same node
+            $row.animate({
+                backgroundColor: RECENTLY_MOVED_COLOR
+            }, RECENTLY_FADE_DURATION, fade_out);
+            $(index.nodes[node_id] || []).not($row).animate({
+                backgroundColor: RECENTLY_MOVED_CLONE
+            }, RECENTLY_FADE_DURATION / 2, fade_out);
+        };
+
+        var remove_rows = function (elems) {
+            unindex_rows(elems);
+            $(elems).remove();
+        };
+
+        var remove_descendants = function ($row) {
+            remove_rows(descendant_rows($row[0], false));
+        };
+
+        var remove_moved = function (result) {
+            // Remove the rows of the node below the parent it was moved from
+            if (result.as_clone) {
+                return;
+            }
+            $(index.nodes[result.node_id] || []).filter('[parent="' + result.old_parent_id + '"]').each(function () {
+                remove_descendants($(this));
+                remove_rows([this]);
+            });
+        };
+
+        var insert_rows = function (target_path, target_id, rows) {
+            // Replace the children rows of the target with the rendered rows
+            var $rows = $($.parseHTML($.trim(rows))).filter('tr');
+            if ($('#drag-enable').val() === "1") {
+                $rows.find('td.drag-handler span').addClass('active');
+            }
+            if (!target_path) {
+                $rows.appendTo($('#result_list tbody').first());
+                index_rows($rows.get());
+                return;
+            }
+            var $target = $('#path-' + target_path);
+            remove_descendants($target);
+            $target.attr('children-num', $rows.length);
+            $target.find('a.collapse').removeClass('collapsed lazy').addClass('expanded').text('-');
+            $rows.insertAfter($target);
+            index_rows($rows.get());
+            // Other rows of the target node now show stale children,
+            // collapse them so they are fetched again when expanded
+            $(index.nodes[target_id] || []).not($target).each(function () {
+                remove_descendants($(this));
+                $(this).attr('children-num', $rows.length);
+                $(this).find('a.collapse').removeClass('expanded').addClass('collapsed lazy').text('+');
+            });
+        };
+
+        var moved_row = function (target_path, node_id) {
+            return $(index.rows['path-' + (target_path ? target_path + '-' : '') + node_id] || []);
+        };
+
+        var apply_move = function (data) {
+            // Patch the table with the rows returned by a successful move
+            show_message('info', data.message);
+            if (!data.node_id) {
+                // Nothing was moved
+                return;
+            }
+            if (data.rows === null) {
+                // The target row is unknown, so the table can't be patched
+                window.location.reload();
+                return;
+            }
+            remove_moved(data);
+            insert_rows(data.target_path, data.target_id, data.rows);
+            highlight_moved(moved_row(data.target_path, data.node_id), data.node_id);
+        };
+
+        var apply_bulk_move = function (data) {
+            // Patch the table with the rows returned by a bulk move
+            var unknown_target = false;
+            $.each(data.rendered, function (index, rendered) {
+                unknown_target = unknown_target || rendered.rows === null;
+            });
+            if (unknown_target) {
+                window.location.reload();
+                return;
+            }
+            $.each(data.results, function (index, result) {
+                show_message('info', result.message);
+                remove_moved(result);
+            });
+            $.each(data.rendered, function (index, rendered) {
+                insert_rows(rendered.target_path, rendered.target_id, rendered.rows);
+            });
+            $.each(data.results, function (index, result) {
+                highlight_moved(moved_row(result.target_path, result.node_id), result.node_id);
+            });
+        };
+
+        var show_move_error = function (req) {
+            // On error (!200) display the messages, the table is left untouched
+            var data = req.responseJSON || {};
+            show_message('error', data.message || gettext('Exception raised during move'));
+            $.each(data.results || [], function (index, result) {
+                if (result.status !== 'OK') {
+                    show_message('error', result.message);
+                }
+            });
+        };
+
+        index_rows($('#result_list tr').get());
+
+        var virtual_tree = null;
+        var $tree_json = $('#dag-tree-json');
+        if ($tree_json.length) {
+            virtual_tree = new VirtualTree($('#result_list'), JSON.parse($tree_json.text()));
+        }
+
         if ($('#collapse-enable').val() === "1") {
-            $('a.collapse').click(function () {
-                var node = new Node($(this).closest('tr')[0]); // send the DOM node, not jQ
+            // Delegated, so rows fetched for lazy trees are handled too
+            $('#result_list').on('click', 'a.collapse', function () {
+                var $row = $(this).closest('tr');
+                if (virtual_tree !== null) {
+                    virtual_tree.toggle($row.attr('id'));
+                    return false;
+                }
+                var node = new Node($row[0]); // send the DOM node, not jQ
                 node.toggle();
                 return false;
             });
+            // Each row is visited once, however deep the tree
+            $('.results').on('click', 'a.dag-expand-all', function () {
+                if (virtual_tree !== null) {
+                    virtual_tree.expand_all();
+                    return false;
+                }
+                var rows = [];
+                $.each(index.rows, function (id, elem) {
+                    rows.push(elem);
+                });
+                $(rows).show();
+                // Lazy rows stay collapsed, their children haven't been fetched
+                $('#result_list a.collapse.collapsed').not('.lazy').removeClass('collapsed').addClass('expanded');
+                return false;
+            }).on('click', 'a.dag-collapse-all', function () {
+                if (virtual_tree !== null) {
+                    virtual_tree.collapse_all();
+                    return false;
+                }
+                var rows = [];
+                $.each(index.rows, function (id, elem) {
+                    if (index.rows[parent_row_id(elem)] !== undefined) {
+                        rows.push(elem);
+                    }
+                });
+                $(rows).hide();
+                $('#result_list a.collapse.expanded').removeClass('expanded').addClass('collapsed');
+                return false;
+            });
         }
 
         // Don't activate drag or collapse if GET filters are set on the page
         if ($('#drag-enable').val() === "1") {
             // Activate all rows for drag & drop
             // then bind mouse down event
-            $('td.drag-handler span').addClass('active').bind('mousedown', function (evt) {
+            $('td.drag-handler span').addClass('active');
+            $('#result_list').on('mousedown', 'td.drag-handler span.active', function (evt) {
                 $ghost = $('<div id="ghost"></div>');
                 $drag_line = $('<div id="drag_line"><span></span></div>');
                 $ghost.appendTo($body);
                 $drag_line.appendTo($body);
 
                 var stop_drag = function () {
+                    if (frame !== null) {
+                        window.cancelAnimationFrame(frame);
+                        frame = null;
+                    }
                     $ghost.remove();
                     $drag_line.remove();
                     $body.enableSelection().unbind('mousemove').unbind('mouseup');
-                    node.elem.removeAttribute('style');
+                    $.each(moving, function (index, moved) {
+                        moved.elem.removeAttribute('style');
+                    });
                 };
 
                 // Create a clone create the illusion that we're moving the node
                 var node = new Node($(this).closest('tr')[0]);
                 cloned_node = node.clone();
-                node.$elem.css({
-                    'background': ACTIVE_NODE_BG_COLOR
+
+                // Dragging one of several selected rows moves all of them
+                var $selected = $('#result_list tr').has('input.action-select:checked');
+                var moving = [node];
+                if ($selected.length > 1 && $selected.is(node.$elem)) {
+                    moving = $selected.map(function () {
+                        return new Node(this);
+                    }).get();
+                }
+                $.each(moving, function (index, moved) {
+                    moved.$elem.css({
+                        'background': ACTIVE_NODE_BG_COLOR
+                    });
                 });
 
                 $targetRow = null;
                 as_child = false;
+                as_clone = false;
 
-                // Now make the new clone move with the mouse
-                $body.disableSelection().bind('mousemove',function (evt2) {
+                // Row geometry is measured once, not on every mouse move
+                var $tbody = node.$elem.parent();
+                var rowHeight = node.$elem.height();
+                var rowLeft = node.$elem.offset().left;
+                var rowWidth = node.$elem.width();
+                var node_top = node.$elem.offset().top;
+                var $tooltip = $drag_line.find('span');
+                var geometry = null;
+
+                var measure_rows = function () {
+                    // Top and height of the visible rows, in document order
+                    var tops = [], heights = [], elems = [];
+                    $tbody.children('tr').each(function () {
+                        var $row = $(this);
+                        if (!$row.is(':visible')) {
+                            return;
+                        }
+                        elems.push(this);
+                        tops.push($row.offset().top);
+                        heights.push($row.outerHeight());
+                    });
+                    return {count: $tbody[0].rows.length, tops: tops, heights: heights, elems: elems};
+                };
+
+                var find_row = function (pageY) {
+                    // Binary search for the last row starting above pageY
+                    if (geometry === null || geometry.count !== $tbody[0].rows.length) {
+                        // Rows were expanded, or fetched for a lazy tree
+                        geometry = measure_rows();
+                    }
+                    var tops = geometry.tops;
+                    var low = 0, high = tops.length - 1, found = -1;
+                    while (low <= high) {
+                        var mid = (low + high) >> 1;
+                        if (tops[mid] <= pageY) {
+                            found = mid;
+                            low = mid + 1;
+                        } else {
+                            high = mid - 1;
+                        }
+                    }
+                    if (found === -1 || pageY > tops[found] + geometry.heights[found]) {
+                        return null;
+                    }
+                    return {elem: geometry.elems[found], top: tops[found], height: geometry.heights[found]};
+                };
+
+                $tooltip.css({
+                    'left': rowWidth - $tooltip.width(),
+                    'height': rowHeight
+                });
+
+                var update_drag = function (evt2) {
                     $ghost.html(cloned_node).css({  // from FeinCMS :P
                         'opacity': .8,
                         'position': 'absolute',
@@ -156,94 +708,110 @@
                         'left': evt2.pageX - 30,
                         'width': 600
                     });
-                    // Iterate through all rows and see where am I moving so I can place
-                    // the drag line accordingly
-                    rowHeight = node.$elem.height();
-                    $('tr', node.$elem.parent()).each(function (index, element) {
-                        $row = $(element);
-                        rtop = $row.offset().top;
-                        // The tooltop will display whether I'm droping the element as
-                        // child or sibling
-                        $tooltip = $drag_line.find('span');
-                        $tooltip.css({
-                            'left': node.$elem.width() - $tooltip.width(),
+                    // The tooltop will display whether I'm droping the element as
+                    // child or sibling
+                    as_clone = evt2.shiftKey;
+
+                    // Check if you are dragging over the same node
+                    if (evt2.pageY >= node_top && evt2.pageY <= node_top + rowHeight) {
+                        $targetRow = null;
+                        $tooltip.text(gettext('Abort'));
+                        $drag_line.css({
+                            'top': node_top,
                             'height': rowHeight,
+                            'borderWidth': 0,
+                            'opacity': 0.8,
+                            'backgroundColor': ABORT_COLOR,
+                            'background-image': 'inherit'
+                        });
+                        return;
+                    }
+                    // Find the row the mouse is over, so I can place the drag line
+                    var row = find_row(evt2.pageY);
+                    if (row === null) {
+                        return;
+                    }
+                    var rtop = row.top;
+                    $targetRow = $(row.elem);
+                    target_node = new Node(row.elem);
+                    if (evt2.pageY <= rtop + row.height / 2) {
+                        // The mouse is positioned on the top half of a $row
+                        if (target_node.is_collapsed()) {
+                            target_node.expand();
+                            geometry = null;
+                        }
+                        as_child = true;
+                        $drag_line.css({
+                            'top': rtop,
+                            'left': rowLeft,
+                            'height': rowHeight,
+                            'opacity': 0.4,
+                            'width': rowWidth,
+                            'borderWidth': 0,
+                            'backgroundColor': DRAG_LINE_COLOR,
+                            'background-image': 'inherit'
                         });
-                        node_top = node.$elem.offset().top;
-                        as_clone = event.getModifierState("Shift");
-
-                        // Check if you are dragging over the same node
-                        if (evt2.pageY >= node_top && evt2.pageY <= node_top + rowHeight) {
-                            $targetRow = null;
-                            $tooltip.text(gettext('Abort'));
-                            $drag_line.css({
-                                'top': node_top,
-                                'height': rowHeight,
-                                'borderWidth': 0,
-                                'opacity': 0.8,
-                                'backgroundColor': ABORT_COLOR,
-                                'background-image': 'inherit'
-                            });
-                        } else
-                        // Check if mouse is over this row
-                        if (evt2.pageY >= rtop && evt2.pageY <= rtop + rowHeight / 2) {
-                            // The mouse is positioned on the top half of a $row
-                            $targetRow = $row;
-                            target_node = new Node($targetRow[0]);
-                            if (target_node.is_collapsed()) {
-                                target_node.expand();
-                            }
-                            as_child = true;
-                            $drag_line.css({
-                                'top': rtop,
-                                'left': node.$elem.offset().left,
-                                'height': rowHeight,
-                                'opacity': 0.4,
-                                'width': node.$elem.width(),
-                                'borderWidth': 0,
-                                'backgroundColor': DRAG_LINE_COLOR,
-                                'background-image': 'inherit'
-                            });
-
-                            if (as_clone === true){
-                                $tooltip.text(interpolate(
-                                    gettext('Clone as child of %(id)s'), {id: target_node.node_id}, true));
-                            }else{
-                                $tooltip.text(interpolate(
-                                    gettext('Move as child of %(id)s'),  {id: target_node.node_id}, true));
-                            }
-                        } else if (evt2.pageY >= rtop + rowHeight / 2 && evt2.pageY <= rtop + rowHeight) {
-                            // The mouse is positioned on the bottom half of a row
-                            $targetRow = $row;
-                            as_child = false;
-                            parent_node = node.parent_node()
 
-                            target_node = new Node($targetRow[0]);
-                            ourRowHeight = rowHeight
-                            if (!target_node.is_collapsed()) {
-                                ourRowHeight = rowHeight * Math.max(target_node.children(false).length + (
-                                    parent_node.node_id===target_node.node_id? 0: 1
-                                ), 1);
-                            }
-                            $drag_line.css({
-                                'left': node.$elem.offset().left,
-                                'width': node.$elem.width(),
-                                'top': rtop,
-                                'borderWidth': '5px',
-                                'height': ourRowHeight,
-                                'opacity': 0.4,
-                                'background-image': 'linear-gradient(to bottom, '+ DRAG_LINE_COLOR +', white)',
-                            });
-                            if (as_clone === true){
-                                $tooltip.text(interpolate(
-                                    gettext('Clone as Sibling of %(id)s'), {id: target_node.node_id}, true));
-                            }else{
-                                $tooltip.text(interpolate(
-                                    gettext('Move as Sibling of %(id)s'), {id: target_node.node_id}, true));
-                            }
+                        if (as_clone === true){
+                            $tooltip.text(interpolate(
+                                gettext('Clone as child of %(id)s'), {id: target_node.node_id}, true));
+                        }else{
+                            $tooltip.text(interpolate(
+                                gettext('Move as child of %(id)s'),  {id: target_node.node_id}, true));
                         }
-                    });
+                    } else {
+                        // The mouse is positioned on the bottom half of a row
+                        as_child = false;
+                        parent_node = node.parent_node()
+
+                        ourRowHeight = rowHeight
+                        if (!target_node.is_collapsed()) {
+                            ourRowHeight = rowHeight * Math.max(target_node.descendants(false).length + (
+                                parent_node.node_id===target_node.node_id? 0: 1
+                            ), 1);
+                        }
+                        $drag_line.css({
+                            'left': rowLeft,
+                            'width': rowWidth,
+                            'top': rtop,
+                            'borderWidth': '5px',
+                            'height': ourRowHeight,
+                            'opacity': 0.4,
+                            'background-image': 'linear-gradient(to bottom, '+ DRAG_LINE_COLOR +', white)',
+                        });
+                        if (as_clone === true){
+                            $tooltip.text(interpolate(
+                                gettext('Clone as Sibling of %(id)s'), {id: target_node.node_id}, true));
+                        }else{
+                            $tooltip.text(interpolate(
+                                gettext('Move as Sibling of %(id)s'), {id: target_node.node_id}, true));
+                        }
+                    }
+                };
+
+                // Mouse moves are coalesced, the drag is updated once per frame
+                var last_move = null;
+                var frame = null;
+                var flush_drag = function () {
+                    if (frame !== null) {
+                        window.cancelAnimationFrame(frame);
+                        frame = null;
+                        update_drag(last_move);
+                    }
+                };
+
+                // Now make the new clone move with the mouse
+                $body.disableSelection().bind('mousemove',function (evt2) {
+                    last_move = evt2;
+                    if (frame === null) {
+                        frame = window.requestAnimationFrame(function () {
+                            frame = null;
+                            update_drag(last_move);
+                        });
+                    }
                 }).bind('mouseup',function () {
+                        // Apply the last mouse move before dropping
+                        flush_drag();
                         if ($targetRow !== null) {
 
                             row_id=node.elem.id.split('-')[1]
@@ -255,36 +823,41 @@
                                  + target_node.node_name());*/
                                 // Call $.ajax so we can handle the error
                                 // On Drop, make an XHR call to perform the node move
-                                $.ajax({
-                                    url: window.MOVE_NODE_ENDPOINT,
-                                    type: 'POST',
-                                    data: {
-                                        node_id: node.node_id,
-                                        node_parent_id: node.parent_id,
+                                var target_row_path = target_node.$elem.attr('id').substring('path-'.length);
+                                var target_path = as_child ?
+                                    target_row_path :
+                                    target_row_path.split('-').slice(0, -1).join('-');
+                                var moves = $.map(moving, function (moved) {
+                                    return {
+                                        node_id: moved.node_id,
+                                        node_parent_id: moved.parent_id,
                                         sibling_id: target_node.node_id,
                                         as_child: as_child ? 1 : 0,
                                         sibling_parent_id: target_node.parent_id,
                                         as_clone: as_clone ? 1 : 0,
-
-                                    },
-                                    complete: function (req, status) {
-                                        // http://stackoverflow.com/questions/1439895/add-a-hash-with-javascript-to-url-without-scrolling-page/1439910#1439910
-
-                                        window.location.hash = 'path-' +
-                                            target_node.$elem.attr('id').split('-').slice(
-                                                    1, as_child ? -1 : -2
-                                                ).concat([node.node_id]).join('-');
-                                        node.$elem.remove();
-                                        window.location.reload();
-                                    },
-                                    error: function (req, status, error) {
-                                        // On error (!200) also reload to display
-                                        // the message
-                                        window.location.hash = node.$elem.attr('id').split('-').slice(0,-1).join('-')
-                                        node.$elem.remove();
-                                        window.location.reload();
-                                    }
+                                        target_path: target_path
+                                    };
                                 });
+                                if (moves.length > 1) {
+                                    $.ajax({
+                                        url: window.MOVE_NODES_ENDPOINT,
+                                        type: 'POST',
+                                        contentType: 'application/json',
+                                        dataType: 'json',
+                                        data: JSON.stringify({moves: moves}),
+                                        success: apply_bulk_move,
+                                        error: show_move_error
+                                    });
+                                } else {
+                                    $.ajax({
+                                        url: window.MOVE_NODE_ENDPOINT,
+                                        type: 'POST',
+                                        dataType: 'json',
+                                        data: moves[0],
+                                        success: apply_move,
+                                        error: show_move_error
+                                    });
+                                }
                             }
                         }
                         stop_drag();
@@ -300,25 +873,7 @@
             // This is a hack, the actual element's id ends in '-id' but the url's hash
             // doesn't, I'm doing this to avoid scrolling the page... is that a good thing?
             if (hash) {
-                node_id = hash.split('-').slice(-1)[0];
-                $(hash).animate({
-                    backgroundColor: RECENTLY_MOVED_COLOR
-                }, RECENTLY_FADE_DURATION, function () {
-                    $(this).animate({
-                        backgroundColor: RECENTLY_MOVED_FADEOUT
-                    }, RECENTLY_FADE_DURATION, function () {
-                        this.removeAttribute('style');
-                    });
-                });
-                $('[node="'+node_id+'"]:not('+ hash+')').animate({
-                    backgroundColor: RECENTLY_MOVED_CLONE
-                }, RECENTLY_FADE_DURATION/2, function () {
-                    $(this).animate({
-                        backgroundColor: RECENTLY_MOVED_FADEOUT
-                    }, RECENTLY_FADE_DURATION, function () {
-                        this.removeAttribute('style');
-                    });
-                });
+                highlight_moved($(hash), hash.split('-').slice(-1)[0]);
             }
 
         }
@@ -6,7 +6,8 @@ These are to support the adding of drag and drop to the change list
 
 import datetime
 import logging
-from itertools import chain
+from tempfile import SpooledTemporaryFile
+from itertools import chain, islice
 from django.db import models
 from django.contrib.admin.templatetags.admin_list import result_hidden_fields
 from django.contrib.admin.templatetags.admin_list import (
@@ -19,18 +20,30 @@ from django.contrib.admin.utils import (
 )
 from django.core.exceptions import ObjectDoesNotExist
 from django.template import Library
+from django.template.loader import get_template
 from django.templatetags.static import static
 from django.utils.encoding import force_str
 from django.utils.html import conditional_escape, format_html
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
-from django_dag_admin.views import LAYOUT_VAR, TREE_LAYOUT, LIST_LAYOUT
+from django.contrib.admin.views.main import ALL_VAR, PAGE_VAR
+from django_dag_admin.views import (
+    AFTER_VAR, BEFORE_VAR, LAYOUT_VAR, TREE_LAYOUT, LIST_LAYOUT
+)
 from django_dag_admin.templatetags import needs_checkboxes
 from django_dag_admin.utils import get_nodedepth
+from django_dag_admin.utils.fragments import RowFragmentCache
 
 
 register = Library()
 logger = logging.getLogger(__name__)
+# Placeholder for the streamed rows in the rendered changelist
+STREAM_MARKER = mark_safe('<!-- django-dag-admin:streamed-rows -->')
+STREAM_SPOOL_SIZE = 64 * 1024
+ROW_FIELDS = ('node_id', 'parent_id', 'node_level', 'children_num', 'edge_id', 'path', 'result')
+JSON_ROW_FIELDS = ('node', 'parent', 'depth', 'children', 'edge', 'path', 'collapse', 'label')
+# States of the collapse link of the rows of a compact tree
+COLLAPSE_NONE, COLLAPSE_EXPANDED, COLLAPSE_LAZY = range(3)
 
 
 def get_result_and_row_class(clist, field_name, result):
@@ -82,8 +95,13 @@ def get_spacer(first, depth):
     return spacer
 
 
-def get_collapse(result, has_children):
-    if has_children:
+def get_collapse(result, has_children, lazy=False, collapsed=False):
+    if lazy:
+        # Children are not rendered yet, they are fetched on expand
+        collapse = ('<a href="#" title="" class="collapse collapsed lazy">+</a>')
+    elif has_children and collapsed:
+        collapse = ('<a href="#" title="" class="collapse collapsed">+</a>')
+    elif has_children:
         collapse = ('<a href="#" title="" class="collapse expanded">-</a>')
     else:
         collapse = '<span class="collapse">&nbsp;</span>'
@@ -98,89 +116,214 @@ def get_drag_handler(first):
     return drag_handler
 
 
-def get_detached_path_items(clist, upper_parent, node_path):
-    for parent in upper_parent.ancestors:
-        if str(parent.pk).rjust(4, '0') in node_path:
-            for attr in ['pk']:
-                value = parent.serializable_value(attr)
-                result_id = "'%s'" % force_str(value)
-                url = clist.url_for_result(parent)
-                onclickstr = (
-                    ' onclick="opener.dismissRelatedLookupPopup(window, %s);'
-                    ' return false;"')
-                yield mark_safe(
-                    '<a href="%s"%s>%s</a>' % (
-                        url,
-                        (clist.is_popup and onclickstr % result_id or ''),
-                        conditional_escape(force_str(value))
-                    )
-                )
+class DetachedPathNodes:
+    """
+    Collects the node pks of the detached paths of a page of rows, and loads
+    them all with a single query once the first label is rendered.
+    """
+    def __init__(self, clist):
+        self.clist = clist
+        self.to_python = clist.model._meta.pk.to_python
+        self.pending = set()
+        self.nodes = {}
+
+    def add(self, node_path):
+        self.pending.update(
+            pk for pk in map(self.to_python, node_path) if pk not in self.nodes)
+
+    def get(self, pk):
+        if self.pending:
+            self.nodes.update(self.clist.root_queryset.in_bulk(self.pending))
+            self.pending = set()
+        return self.nodes.get(self.to_python(pk))
 
 
-def items_for_result(clist, result, form, depth=None, has_children=0):
+def get_detached_path_items(clist, path_nodes, node_path):
     """
-    Generates the actual list of data.
+    Yields a link to each node of ``node_path``, whose pks must have been
+    added to ``path_nodes`` beforehand.
+    """
+    for pk in node_path:
+        parent = path_nodes.get(pk)
+        if parent is None:
+            continue
+        value = parent.serializable_value('pk')
+        result_id = "'%s'" % force_str(value)
+        url = clist.url_for_result(parent)
+        onclickstr = (
+            ' onclick="opener.dismissRelatedLookupPopup(window, %s);'
+            ' return false;"')
+        yield mark_safe(
+            '<a href="%s"%s>%s</a>' % (
+                url,
+                (clist.is_popup and onclickstr % result_id or ''),
+                conditional_escape(force_str(value))
+            )
+        )
 
-    This has been shamelessly copied from original
-    django.contrib.admin.templatetags.admin_list.items_for_result
-    in order to alter the dispay for the first element
+
+def render_result_fragments(clist, result):
     """
-    first = True
-    pk = clist.lookup_opts.pk.attname
+    Returns the parts of a row that do not depend on the path it is shown
+    at: the escaped value and class attribute of each field, the change url
+    and the value passed to a popup opener, plus the html of the row cells
+    around the depth spacer and collapse link of the first link cell.
+    """
+    if clist.to_field:
+        attr = str(clist.to_field)
+    else:
+        attr = clist.lookup_opts.pk.attname
+    cells = []
     for field_name in clist.list_display:
-        result_repr, row_class = get_result_and_row_class(clist, field_name,
-                                                          result)
+        result_repr, row_class = get_result_and_row_class(clist, field_name, result)
+        cells.append((conditional_escape(result_repr), row_class))
+    fragments = {
+        'cells': cells,
+        'url': clist.url_for_result(result),
+        'value': force_str(result.serializable_value(attr)),
+    }
+    fragments['html'] = list(render_cells(clist, fragments))
+    return fragments
+
+
+def render_cells(clist, fragments):
+    """
+    Yields the html of each cell of a row as a ``(before, after)`` pair, the
+    first link cell being split where the spacer and collapse link go.
+    """
+    first = True
+    onclickstr = (
+        ' onclick="opener.dismissRelatedLookupPopup(window, %s);'
+        ' return false;"')
+    for field_name, (result_repr, row_class) in zip(clist.list_display, fragments['cells']):
         # If list_display_links not defined, add the link tag to the
         # first field
         if (first and not clist.list_display_links) or \
            field_name in clist.list_display_links:
             table_tag = {True: 'th', False: 'td'}[first]
-            # This spacer indents the nodes based on their depth
-            nodedepth = get_nodedepth(result) if depth is None else depth
-            spacer = get_spacer(first, nodedepth)
-
-            # This shows a collapse or expand link for nodes with childs
-            collapse = get_collapse(result, has_children)
-            # Add a <td/> before the first col to show the drag handler
-            drag_handler = get_drag_handler(first)
             first = False
-            url = clist.url_for_result(result)
             # Convert the pk to something that can be used in Javascript.
             # Problem cases are long ints (23L) and non-ASCII strings.
-            if clist.to_field:
-                attr = str(clist.to_field)
-            else:
-                attr = pk
-            value = result.serializable_value(attr)
-            result_id = "'%s'" % force_str(value)
-            onclickstr = (
-                ' onclick="opener.dismissRelatedLookupPopup(window, %s);'
-                ' return false;"')
-            yield mark_safe(
-                '%s<%s%s>%s %s <a href="%s"%s>%s</a></%s>' % (
-                    drag_handler, table_tag, row_class, spacer, collapse, url,
+            result_id = "'%s'" % fragments['value']
+            yield (
+                mark_safe('<%s%s>' % (table_tag, row_class)),
+                mark_safe(' <a href="%s"%s>%s</a></%s>' % (
+                    fragments['url'],
                     (clist.is_popup and onclickstr % result_id or ''),
-                    conditional_escape(result_repr), table_tag))
+                    result_repr, table_tag)),
+            )
         else:
+            yield format_html('<td{0}>{1}</td>', row_class, result_repr), None
+
+
+def get_row_cache(clist, request):
+    """
+    Returns the fragment cache shared by the rows rendered for ``clist``
+    """
+    row_cache = getattr(clist, 'row_cache', None)
+    if row_cache is None:
+        row_cache = clist.row_cache = RowFragmentCache(
+            clist, request, render_result_fragments)
+    return row_cache
+
+
+def items_for_result(clist, result, form, depth=None, has_children=0, lazy=False,
+                     row_cache=None):
+    """
+    Generates the actual list of data.
+
+    This has been shamelessly copied from original
+    django.contrib.admin.templatetags.admin_list.items_for_result
+    in order to alter the dispay for the first element
+
+    The cells are rendered once per node, only the spacer, collapse link
+    and drag handler of the first cell depend on the path shown.
+    """
+    if form:
+        yield from items_for_form_result(clist, result, form, depth, has_children, lazy)
+        return
+    if row_cache is not None:
+        fragments = row_cache.get(result)
+    else:
+        fragments = render_result_fragments(clist, result)
+    first = True
+    for before, after in fragments['html']:
+        if after is None:
+            yield before
+            continue
+        # This spacer indents the nodes based on their depth
+        nodedepth = get_nodedepth(result) if depth is None else depth
+        spacer = get_spacer(first, nodedepth)
+        # This shows a collapse or expand link for nodes with childs
+        collapse = get_collapse(result, has_children, lazy)
+        # Add a <td/> before the first col to show the drag handler
+        drag_handler = get_drag_handler(first)
+        first = False
+        yield mark_safe('%s%s%s %s%s' % (drag_handler, before, spacer, collapse, after))
+
+
+def items_for_form_result(clist, result, form, depth=None, has_children=0, lazy=False):
+    """
+    Generates the row of a result edited with a list_editable form, whose
+    cells are rendered on every call.
+    """
+    first = True
+    fragments = render_result_fragments(clist, result)
+    rows = zip(clist.list_display, fragments['cells'], fragments['html'])
+    for field_name, (result_repr, row_class), (before, after) in rows:
+        if after is not None:
+            nodedepth = get_nodedepth(result) if depth is None else depth
+            yield mark_safe('%s%s%s %s%s' % (
+                get_drag_handler(first), before, get_spacer(first, nodedepth),
+                get_collapse(result, has_children, lazy), after))
+            first = False
+        elif field_name in form.fields and not (
+                field_name == clist.model._meta.pk.name and
+                form[clist.model._meta.pk.name].is_hidden):
             # By default the fields come from ModelAdmin.list_editable, but if
             # we pull the fields out of the form instead of list_editable
             # custom admins can provide fields on a per request basis
-            if (
-                    form and
-                    field_name in form.fields and
-                    not (
-                        field_name == clist.model._meta.pk.name and
-                        form[clist.model._meta.pk.name].is_hidden
-                    )
-            ):
-                bf = form[field_name]
-                result_repr = mark_safe(force_str(bf.errors) + force_str(bf))
+            bf = form[field_name]
+            result_repr = mark_safe(force_str(bf.errors) + force_str(bf))
             yield format_html('<td{0}>{1}</td>', row_class, result_repr)
-    if form and not form[clist.model._meta.pk.name].is_hidden:
+        else:
+            yield before
+    if not form[clist.model._meta.pk.name].is_hidden:
         yield format_html('<td>{0}</td>',
                           force_str(form[clist.model._meta.pk.name]))
 
 
+def render_row_items(clist, result, depth, has_children, lazy, row_cache):
+    """
+    Returns the rendered cells of a row
+    """
+    return list(items_for_result(
+        clist, result, None,
+        depth=depth,
+        has_children=has_children,
+        lazy=lazy,
+        row_cache=row_cache,
+    ))
+
+
+class JsonRowItems:
+    """
+    Stands in for ``render_row_items`` in the rows of a compact tree: the
+    cells of each node are kept once, however many rows show it, and the
+    row only holds the state of its collapse link.
+    """
+    def __init__(self):
+        self.nodes = {}
+
+    def __call__(self, clist, result, depth, has_children, lazy, row_cache):
+        pk = str(result.pk)
+        if pk not in self.nodes:
+            self.nodes[pk] = row_cache.get(result)['html']
+        if lazy:
+            return COLLAPSE_LAZY
+        return COLLAPSE_EXPANDED if has_children else COLLAPSE_NONE
+
+
 def get_path_id(root_parts, leaf):
     return '-'.join(map(
         lambda x: str(x.pk),
@@ -189,37 +332,37 @@ def get_path_id(root_parts, leaf):
         )))
 
 
-def results(clst, request):
+def results(clst, request, row_items=render_row_items):
     yield None, None  # Fake entry to ensure list as started and can be split
     if clst.get_layout_style(request) == LIST_LAYOUT:
-        yield from list_results(clst, request, clst.result_list)
+        yield from list_results(clst, request, clst.result_list, row_items)
     else:
-        yield from tree_results(clst, request, clst.result_list)
+        timer = clst.model_admin.get_phase_timer(request)
+        yield from timer.iter_phase(
+            'tree_results', tree_results(clst, request, clst.result_list, row_items))
 
 
-def list_results(clst, request, result_list):
+def list_results(clst, request, result_list, row_items=render_row_items):
     if clst.formset:
         raise NotImplementedError("Dag Admin as formSet not supported")
     else:
-        for res in result_list:
-            yield (
-                (
-                    res.pk, '', '',
-                    res.children_count, '', '',
-
-                    list(
-                        items_for_result(
-                            clst, res, None,
-                            depth=0,
-                            has_children=bool(res.children),
-                        )
-                    )
-                ),
-                None
-            )
+        row_cache = get_row_cache(clst, request)
+        for chunk in iter_chunks(result_list, clst.model_admin.stream_chunk_size):
+            row_cache.prefetch(chunk)
+            for res in chunk:
+                yield (
+                    (
+                        res.pk, '', '',
+                        res.children_count, '', '',
+
+                        row_items(
+                            clst, res, 0, bool(res.children), False, row_cache)
+                    ),
+                    None
+                )
 
 
-def tree_results(clst, request, result_list):
+def tree_results(clst, request, result_list, row_items=render_row_items):
     """
     For each row/item in the dag should yield a tuple of
         * node_id
@@ -236,33 +379,35 @@ def tree_results(clst, request, result_list):
     lastnode = None
     lastnode_detached = None
     lastnode_detached_path = []
-
-    qs_pks = set(clst.get_results_tree(request).order_by().values_list('pk', flat=True))
+    lazy_depth = clst.get_lazy_tree_depth(request)
 
     if clst.formset:
         raise NotImplementedError("Dag Admin as formSet not supported")
     else:
-        for node in result_list:
-            path = node.dag_node_path.split(clst.model_admin.path_seperator)
+        qs_pks = clst.filtered_pks if lazy_depth is None else set()
+        row_cache = get_row_cache(clst, request)
+        path_nodes = DetachedPathNodes(clst)
+        for node, path, edge_map in iter_tree_chunks(clst, result_list):
+            if lazy_depth is not None:
+                # Lazy trees are never filtered so every node on the paths is
+                # part of the result set
+                qs_pks.update(int(pk) for pk in path)
             depth = len(path) - 1
             row = [
                 path[-1],
                 path[-2] if depth else '',
                 depth,
                 node.children_count,
-                getattr(
-                        node,
-                        node.parents.through._meta.get_field('child').remote_field.related_name
-                ).filter(
-                    parent__in=map(int, path)
-                ).values_list('pk', flat=True).first(),
+                edge_map.get((path[-2], path[-1])) if depth else None,
                 node.dag_node_path.replace(clst.model_admin.path_seperator, '-'),
-                list(
-                    items_for_result(
-                        clst, node, None,
-                        depth=depth,
-                        has_children=bool(node.children),
-                    )
+                row_items(
+                    clst, node, depth, bool(node.children),
+                    (
+                        lazy_depth is not None and
+                        depth + 1 >= lazy_depth and
+                        bool(node.children_count)
+                    ),
+                    row_cache,
                 )
             ]
             detached_path = get_detached_path(path, lastnode, qs_pks)
@@ -280,7 +425,8 @@ def tree_results(clst, request, result_list):
                 testlen = min(len(detached_path), len(lastnode_detached_path))
                 newgroup = detached_path[:testlen] != lastnode_detached_path[:testlen]
                 if testlen == 0 or newgroup:
-                    row.append(get_detached_path_items(clst, node, detached_path))
+                    path_nodes.add(detached_path)
+                    row.append(get_detached_path_items(clst, path_nodes, detached_path))
                     lastnode_detached_path = detached_path
                 else:
                     row.append(None)
@@ -291,6 +437,69 @@ def tree_results(clst, request, result_list):
             lastnode = path
 
 
+def iter_chunks(items, size):
+    """
+    Yields lists of up to ``size`` of the ``items``
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_tree_chunks(clst, result_list):
+    """
+    Yields each node of ``result_list`` with its split path and the edge map
+    of its chunk, the edges and row fragments being fetched for
+    ``stream_chunk_size`` nodes at a time so streamed results are never
+    held in full.
+    """
+    row_cache = getattr(clst, 'row_cache', None)
+    for nodes in iter_chunks(result_list, clst.model_admin.stream_chunk_size):
+        chunk = [
+            (node, node.dag_node_path.split(clst.model_admin.path_seperator))
+            for node in nodes
+        ]
+        edge_map = clst.get_edge_map(path for node, path in chunk)
+        if row_cache is not None:
+            row_cache.prefetch(nodes)
+        for node, path in chunk:
+            yield node, path, edge_map
+
+
+def tree_node_results(clst, request, parent_path, children, row_items=render_row_items):
+    """
+    Yields a row, in the same form as tree_results, for each of the
+    ``(node, edge_id)`` children placed below ``parent_path``. The children of
+    these rows are left to be fetched when they are expanded.
+    """
+    depth = len(parent_path)
+    children = list(children)
+    row_cache = get_row_cache(clst, request)
+    row_cache.prefetch(node for node, edge_id in children)
+    for node, edge_id in children:
+        yield (
+            str(node.pk),
+            parent_path[-1] if depth else '',
+            depth,
+            node.children_count,
+            edge_id,
+            '-'.join(parent_path + [str(node.pk)]),
+            row_items(
+                clst, node, depth, bool(node.children), bool(node.children_count), row_cache)
+        )
+
+
+def tree_children_results(clst, request, path, row_items=render_row_items):
+    """
+    Yields the rows for the children of the last node of ``path``
+    """
+    return tree_node_results(
+        clst, request, path, clst.get_children_results(request, path[-1]), row_items)
+
+
 def get_detached_path(node_path, lastnode_path, qs_pks,):
     last_path = lastnode_path if lastnode_path else []
     rval = []
@@ -326,17 +535,168 @@ def result_tree(context, clist, request):
     been affected by a GET param or not. Only when the results are not filtered
     you can drag and sort the tree
     """
-    attached, detached = list(zip(*list(results(clist, request))))
-    return {
-        'draggable': clist.allow_node_drag(request),
-        'show_detached_label': clist.model_admin.show_detached_label,
-        'show_attached_label': clist.model_admin.show_attached_label,
-        'result_hidden_fields': list(result_hidden_fields(clist)),
-        'result_headers': result_headers(context, clist, request),
-        'results': {
-            'attached': list(filter(lambda x: x is not None, attached)),
-            'detached': list(filter(lambda x: x is not None, detached)),
+    with clist.model_admin.get_phase_timer(request).phase('result_tree'):
+        headers = result_headers(context, clist, request)
+        # Kept for the rows streamed by stream_result_tree
+        clist.result_header_count = len(headers)
+        tree = {
+            'draggable': clist.allow_node_drag(request),
+            'show_detached_label': clist.model_admin.show_detached_label,
+            'show_attached_label': clist.model_admin.show_attached_label,
+            'result_hidden_fields': list(result_hidden_fields(clist)),
+            'result_headers': headers,
         }
+        if getattr(clist, 'streaming', False):
+            tree.update({'streaming': True, 'stream_marker': STREAM_MARKER})
+            return tree
+        if clist.model_admin.virtual_tree:
+            # The rows are built by the script, only those in view are kept
+            tree.update({
+                'virtual': True,
+                'draggable': False,
+                'tree_json': json_result_tree(clist, request),
+            })
+            return tree
+        attached, detached = [], []
+        for attached_row, detached_row in results(clist, request):
+            if attached_row is not None:
+                attached.append(attached_row)
+            elif detached_row is not None:
+                detached.append(detached_row)
+        tree['results'] = {'attached': attached, 'detached': detached}
+        return tree
+
+
+def stream_result_tree(clist, request):
+    """
+    Yields the html of the result rows of a streamed changelist, a chunk of
+    rows at a time, as ``result_tree`` renders them. The detached rows,
+    shown after the attached ones, are spooled to a temporary file
+    meanwhile. They only show up in filtered trees, whose attached rows are
+    spooled too as their label depends on whether any row is detached.
+    """
+    row_template = get_template('admin/django_dag_admin/change_list_result_row.html')
+    detached_label = get_template('admin/django_dag_admin/change_list_result_detached_label.html')
+    attached_label = get_template('admin/django_dag_admin/change_list_result_attached_label.html')
+    model_admin = clist.model_admin
+    colspan = clist.result_header_count
+    row_classes = ('row1', 'row2')
+    may_detach = clist.get_layout_style(request) != LIST_LAYOUT and bool(
+        clist.query or clist.get_filters_params() or clist.has_selection())
+
+    def attached_head(labelled):
+        if labelled or model_admin.show_attached_label:
+            return '<tbody>' + attached_label.render({'colspan': colspan})
+        return '<tbody>'
+
+    attached_num = detached_num = 0
+    with SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE, mode='w+') as attached_spool, \
+            SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE, mode='w+') as spool:
+        for chunk in iter_chunks(results(clist, request), model_admin.stream_chunk_size):
+            html = []
+            for attached_row, detached_row in chunk:
+                if attached_row is not None:
+                    if not attached_num and not may_detach:
+                        html.append(attached_head(False))
+                    html.append(row_template.render(dict(
+                        zip(ROW_FIELDS, attached_row), row_class=row_classes[attached_num % 2])))
+                    attached_num += 1
+                elif detached_row is not None:
+                    detach_path = detached_row[len(ROW_FIELDS)]
+                    if detach_path and model_admin.show_detached_label:
+                        spool.write(detached_label.render({
+                            'detach_path': detach_path, 'colspan': colspan}))
+                    spool.write(row_template.render(dict(
+                        zip(ROW_FIELDS, detached_row), row_class=row_classes[detached_num % 2])))
+                    detached_num += 1
+            if may_detach:
+                attached_spool.write(''.join(html))
+            else:
+                yield ''.join(html)
+        if may_detach and attached_num:
+            yield attached_head(detached_num)
+            attached_spool.seek(0)
+            yield from iter(lambda: attached_spool.read(STREAM_SPOOL_SIZE), '')
+        if attached_num:
+            yield '</tbody>'
+        if detached_num:
+            spool.seek(0)
+            yield '<tbody>'
+            yield from iter(lambda: spool.read(STREAM_SPOOL_SIZE), '')
+            yield '</tbody>'
+
+
+def get_json_row(row, label=None):
+    node_id, parent_id, depth, children_num, edge_id, path, collapse = row[:len(ROW_FIELDS)]
+    return [str(node_id), str(parent_id), depth, children_num, edge_id, path, collapse, label]
+
+
+def json_result_tree(clist, request, path=None):
+    """
+    Returns the rows of the changelist, or of the children of the last node
+    of ``path``, in a compact form. Each row holds the values of
+    ``JSON_ROW_FIELDS``, the cells of each node are rendered once under
+    ``nodes`` and the markup the script puts around them under ``markup``.
+    """
+    model_admin = clist.model_admin
+    row_items = JsonRowItems()
+    if path is None:
+        rows = results(clist, request, row_items)
+    else:
+        rows = ((row, None) for row in tree_children_results(clist, request, path, row_items))
+    label_template = get_template('admin/django_dag_admin/change_list_result_detached_label.html')
+    colspan = len(list(base_result_headers(clist))) + 1
+    attached, detached = [], []
+    for attached_row, detached_row in rows:
+        if attached_row is not None:
+            attached.append(get_json_row(attached_row))
+        elif detached_row is not None:
+            detach_path = detached_row[len(ROW_FIELDS)]
+            label = None
+            if detach_path and model_admin.show_detached_label:
+                label = label_template.render({'detach_path': detach_path, 'colspan': colspan})
+            detached.append(get_json_row(detached_row, label))
+    attached_label = None
+    if detached or model_admin.show_attached_label:
+        attached_label = get_template(
+            'admin/django_dag_admin/change_list_result_attached_label.html'
+        ).render({'colspan': colspan})
+    return {
+        'fields': JSON_ROW_FIELDS,
+        'attached': attached,
+        'detached': detached,
+        'attached_label': attached_label,
+        'nodes': row_items.nodes,
+        'markup': {
+            'drag_handler': get_drag_handler(True),
+            'spacer': get_spacer(True, 1),
+            'collapse': {
+                'none': get_collapse(None, False),
+                'expanded': get_collapse(None, True),
+                'collapsed': get_collapse(None, True, collapsed=True),
+                'lazy': get_collapse(None, True, lazy=True),
+            },
+        },
+    }
+
+
+@register.inclusion_tag('admin/django_dag_admin/keyset_pagination.html')
+def keyset_pagination(clist):
+    """
+    Previous/next links for a changelist paginated by path cursors
+    """
+    remove = [AFTER_VAR, BEFORE_VAR, PAGE_VAR]
+    previous_url = next_url = None
+    if clist.keyset_previous is not None:
+        previous_url = clist.get_query_string({BEFORE_VAR: clist.keyset_previous}, remove)
+    if clist.keyset_next is not None:
+        next_url = clist.get_query_string({AFTER_VAR: clist.keyset_next}, remove)
+    return {
+        'cl': clist,
+        'previous_url': previous_url,
+        'next_url': next_url,
+        'show_all_url': clist.can_show_all and not clist.show_all and clist.multi_page
+        and clist.get_query_string({ALL_VAR: ''}, remove),
     }
 
 
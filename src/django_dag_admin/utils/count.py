@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Changelist result count strategies
+import hashlib
+import json
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.core.cache import caches
+from django.db import connections
+from ..views import LAYOUT_VAR, SELECTION_PARAMS
+
+
+class ExactCount:
+    """
+    Counts the changelist results as they are displayed, annotations
+    included. This is what the changelist does without a strategy.
+    """
+    def __init__(self, node_model):
+        self.node_model = node_model
+
+    def count(self, changelist, request, queryset):
+        return queryset.count()
+
+    def full_count(self, changelist, request):
+        return changelist.root_queryset.count()
+
+
+class BaseCount(ExactCount):
+    """
+    Counts the filtered nodes without the tree annotations and ordering,
+    which is much cheaper on large graphs. Tree pages are cut from the
+    path rows, a node with several parents having a row per path, so they
+    are still counted exactly: fewer rows would hide the last pages.
+    """
+    def count(self, changelist, request, queryset):
+        if changelist.path_rows is not None:
+            return super().count(changelist, request, queryset)
+        return changelist.queryset.order_by().count()
+
+    def full_count(self, changelist, request):
+        return changelist.root_queryset.order_by().count()
+
+
+class EstimatedCount(ExactCount):
+    """
+    Counts from the planner's row estimate on PostgreSQL. Estimates below
+    ``threshold`` are replaced by the count of the ``fallback`` strategy,
+    as is every count on other databases. The path rows of tree pages are
+    counted exactly, as ``BaseCount`` does.
+    """
+    threshold = 1000
+    fallback = BaseCount
+
+    def __init__(self, node_model, threshold=None, fallback=None):
+        super().__init__(node_model)
+        if threshold is not None:
+            self.threshold = threshold
+        self._fallback = (fallback or self.fallback)(node_model)
+
+    def estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def count(self, changelist, request, queryset):
+        if changelist.path_rows is not None:
+            return super().count(changelist, request, queryset)
+        estimate = self.estimate(changelist.queryset)
+        if estimate is None or estimate < self.threshold:
+            return self._fallback.count(changelist, request, queryset)
+        return estimate
+
+    def full_count(self, changelist, request):
+        estimate = self.estimate(changelist.root_queryset)
+        if estimate is None or estimate < self.threshold:
+            return self._fallback.full_count(changelist, request)
+        return estimate
+
+
+class CachedCount(ExactCount):
+    """
+    Caches the counts of the ``counter`` strategy in Django's cache for
+    ``cache_timeout`` seconds, keyed by the changelist params that change
+    the count: the filters, search, selection and layout. Pages of the same
+    results share their count. The key does not vary on the user, admins
+    restricting ``get_queryset`` per user should not use it.
+    """
+    cache_alias = 'default'
+    cache_timeout = 60
+    counter = ExactCount
+
+    def __init__(self, node_model, cache_alias=None, cache_timeout=None, counter=None):
+        super().__init__(node_model)
+        if cache_alias is not None:
+            self.cache_alias = cache_alias
+        if cache_timeout is not None:
+            self.cache_timeout = cache_timeout
+        self._counter = (counter or self.counter)(node_model)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, changelist=None):
+        """
+        Return the cache key of the filtered count of ``changelist``, or of
+        the full count without one.
+        """
+        key = 'django_dag_admin:count:%s' % self.node_model._meta.label_lower
+        if changelist is None:
+            return key
+        params = sorted(changelist.get_filters_params().items())
+        params.extend(
+            (k, changelist.params[k]) for k in (SEARCH_VAR, LAYOUT_VAR) + SELECTION_PARAMS
+            if k in changelist.params
+        )
+        return '%s:%s' % (key, hashlib.md5(json.dumps(params).encode('utf-8')).hexdigest())
+
+    def _cached(self, key, fn):
+        value = self.cache.get(key)
+        if value is None:
+            value = fn()
+            self.cache.set(key, value, self.cache_timeout)
+        return value
+
+    def count(self, changelist, request, queryset):
+        return self._cached(
+            self.get_cache_key(changelist),
+            lambda: self._counter.count(changelist, request, queryset))
+
+    def full_count(self, changelist, request):
+        return self._cached(
+            self.get_cache_key(),
+            lambda: self._counter.full_count(changelist, request))
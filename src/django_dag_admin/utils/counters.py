@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Denormalized node edge counters
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from ..models import DagCounterMixin
+
+
+def has_edge_counters(node_model):
+    """Return whether ``node_model`` stores its edge counters"""
+    return issubclass(node_model, DagCounterMixin)
+
+
+def rebuild_counters(node_model, pks=None):
+    """
+    Recompute the counters of the nodes with the given ``pks``, or of every
+    node, with a single update statement.
+    """
+    edges = node_model.get_edge_model().objects.order_by()
+
+    def edge_count(field):
+        return Coalesce(Subquery(
+            edges.filter(**{field: OuterRef('pk')})
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ), 0)
+
+    nodes = node_model._default_manager.all()
+    if pks is not None:
+        nodes = nodes.filter(pk__in=pks)
+    return nodes.update(
+        children_count=edge_count('parent'),
+        parents_count=edge_count('child'),
+    )
+
+
+def _edge_added(node_model, parent_id, child_id, delta):
+    nodes = node_model._default_manager
+    nodes.filter(pk=parent_id).update(children_count=F('children_count') + delta)
+    nodes.filter(pk=child_id).update(parents_count=F('parents_count') + delta)
+
+
+def connect_counters(node_model):
+    """
+    Keep the counters of ``node_model`` in step with its edges. Edges saved
+    or deleted one by one and edges added through the ``children`` and
+    ``parents`` relations update the counters with ``F()`` expressions;
+    removals through the relations recompute the nodes involved. Saving an
+    existing edge moved to another parent or child moves its counts too.
+    """
+    edge_model = node_model.get_edge_model()
+    uid = 'django_dag_admin:counters:%s' % node_model._meta.label_lower
+
+    def edge_saving(instance, raw=False, **kwargs):
+        if raw or instance._state.adding:
+            return
+        instance._dag_saved_nodes = edge_model._default_manager \
+            .filter(pk=instance.pk).values_list('parent_id', 'child_id').first()
+
+    def edge_saved(instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        saved_nodes = getattr(instance, '_dag_saved_nodes', None)
+        instance._dag_saved_nodes = None
+        if created:
+            _edge_added(node_model, instance.parent_id, instance.child_id, 1)
+        elif saved_nodes not in (None, (instance.parent_id, instance.child_id)):
+            _edge_added(node_model, saved_nodes[0], saved_nodes[1], -1)
+            _edge_added(node_model, instance.parent_id, instance.child_id, 1)
+
+    def edge_deleted(instance, **kwargs):
+        _edge_added(node_model, instance.parent_id, instance.child_id, -1)
+
+    def edges_changed(instance, action, reverse, pk_set, **kwargs):
+        if action == 'pre_clear':
+            related = instance.parents if reverse else instance.children
+            instance._dag_cleared_pks = set(related.values_list('pk', flat=True))
+        elif action == 'post_add' and pk_set:
+            own, other = ('parents_count', 'children_count') if reverse \
+                else ('children_count', 'parents_count')
+            nodes = node_model._default_manager
+            nodes.filter(pk=instance.pk).update(**{own: F(own) + len(pk_set)})
+            nodes.filter(pk__in=pk_set).update(**{other: F(other) + 1})
+        elif action == 'post_remove' and pk_set:
+            rebuild_counters(node_model, set(pk_set) | {instance.pk})
+        elif action == 'post_clear':
+            pks = getattr(instance, '_dag_cleared_pks', set())
+            rebuild_counters(node_model, pks | {instance.pk})
+
+    pre_save.connect(edge_saving, sender=edge_model, weak=False, dispatch_uid=uid)
+    post_save.connect(edge_saved, sender=edge_model, weak=False, dispatch_uid=uid)
+    post_delete.connect(edge_deleted, sender=edge_model, weak=False, dispatch_uid=uid)
+    m2m_changed.connect(
+        edges_changed, sender=node_model.children.through, weak=False, dispatch_uid=uid)
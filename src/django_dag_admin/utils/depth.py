@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Node depth providers
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from .graph import get_node_depths
+
+_depth_providers = {}
+
+
+def register_depth_provider(node_model, provider):
+    """Use ``provider`` to look up the depths of ``node_model`` nodes"""
+    _depth_providers[node_model._meta.label_lower] = provider
+    provider.connect()
+
+
+def get_depth_provider(node_model):
+    """Return the depth provider registered for ``node_model``, if any"""
+    return _depth_providers.get(node_model._meta.label_lower)
+
+
+class DepthProvider:
+    """
+    Base depth provider, it knows no depths so callers fall back to
+    walking the graph.
+    """
+    def __init__(self, node_model):
+        self.node_model = node_model
+
+    def get_depth(self, node):
+        return None
+
+    def invalidate(self, **kwargs):
+        pass
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+class CachedDepthProvider(DepthProvider):
+    """
+    Provides node depths from a map computed with a single recursive query,
+    kept in Django's cache until an edge of the graph changes.
+    """
+    cache_alias = 'default'
+    cache_timeout = None
+
+    def __init__(self, node_model, cache_alias=None, cache_timeout=None):
+        super().__init__(node_model)
+        if cache_alias is not None:
+            self.cache_alias = cache_alias
+        if cache_timeout is not None:
+            self.cache_timeout = cache_timeout
+        self._local = (None, None)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def cache_key(self):
+        return 'django_dag_admin:depth:%s' % self.node_model._meta.label_lower
+
+    @property
+    def version_key(self):
+        return '%s:version' % self.cache_key
+
+    def get_version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, 1, None)
+            version = self.cache.get(self.version_key, 1)
+        return version
+
+    def get_depth_map(self):
+        version = self.get_version()
+        local_version, depth_map = self._local
+        if local_version == version:
+            return depth_map
+        map_key = '%s:%s' % (self.cache_key, version)
+        depth_map = self.cache.get(map_key)
+        if depth_map is None:
+            depth_map = get_node_depths(self.node_model)
+            self.cache.set(map_key, depth_map, self.cache_timeout)
+        self._local = (version, depth_map)
+        return depth_map
+
+    def get_depth(self, node):
+        return self.get_depth_map().get(node.pk)
+
+    def invalidate(self, **kwargs):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, 1, None)
+        self._local = (None, None)
+
+    def _edges_changed(self, action, **kwargs):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            self.invalidate()
+
+    def connect(self):
+        edge_model = self.node_model.get_edge_model()
+        post_save.connect(
+            self.invalidate, sender=edge_model, weak=False,
+            dispatch_uid=self.cache_key)
+        post_delete.connect(
+            self.invalidate, sender=edge_model, weak=False,
+            dispatch_uid=self.cache_key)
+        m2m_changed.connect(
+            self._edges_changed, sender=self.node_model.children.through,
+            weak=False, dispatch_uid=self.cache_key)
+
+    def disconnect(self):
+        edge_model = self.node_model.get_edge_model()
+        post_save.disconnect(sender=edge_model, dispatch_uid=self.cache_key)
+        post_delete.disconnect(sender=edge_model, dispatch_uid=self.cache_key)
+        m2m_changed.disconnect(
+            sender=self.node_model.children.through, dispatch_uid=self.cache_key)
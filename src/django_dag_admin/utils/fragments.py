@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Rendered changelist row fragments
+import hashlib
+from uuid import uuid4
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.translation import get_language
+
+
+class RowFragmentCache:
+    """
+    Keeps the path independent fragments of each rendered row, keyed by the
+    node pk, its version marker, the displayed fields, the user's
+    permissions, language and time zone. Fragments are shared by the rows
+    of a node within a request and, when the admin enables
+    ``row_fragment_cache``, stored in Django's cache. Without a
+    ``row_version_field`` the stored fragments of every node are dropped
+    whenever a node is saved or deleted, see ``connect_fragments``.
+    """
+    cache_alias = 'default'
+
+    def __init__(self, changelist, request, render):
+        model_admin = changelist.model_admin
+        self.changelist = changelist
+        self.render = render
+        self.persist = model_admin.row_fragment_cache
+        self.timeout = model_admin.row_fragment_cache_timeout
+        self.version_field = model_admin.row_version_field
+        self.local = {}
+        context = repr((
+            tuple(changelist.list_display),
+            tuple(changelist.list_display_links or ()),
+            changelist.is_popup,
+            changelist.to_field,
+            model_admin.has_view_permission(request),
+            model_admin.has_change_permission(request),
+            get_language(),
+            timezone.get_current_timezone_name(),
+        ))
+        self.prefix = 'django_dag_admin:row:%s:%s' % (
+            changelist.model._meta.label_lower,
+            hashlib.md5(context.encode('utf-8')).hexdigest(),
+        )
+        if self.persist and not self.version_field:
+            self.prefix = '%s:%s' % (self.prefix, self.cache.get_or_set(
+                get_generation_key(changelist.model), uuid4().hex, None))
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_key(self, node):
+        version = getattr(node, self.version_field) if self.version_field else ''
+        return '%s:%s:%s' % (self.prefix, node.pk, version)
+
+    def prefetch(self, nodes):
+        """Load the stored fragments of ``nodes`` with a single cache lookup"""
+        if not self.persist:
+            return
+        keys = set(self.get_key(node) for node in nodes) - set(self.local)
+        if keys:
+            self.local.update(self.cache.get_many(keys))
+
+    def get(self, node):
+        key = self.get_key(node)
+        fragments = self.local.get(key)
+        if fragments is None:
+            fragments = self.render(self.changelist, node)
+            self.local[key] = fragments
+            if self.persist:
+                self.cache.set(key, fragments, self.timeout)
+        return fragments
+
+
+def get_generation_key(node_model):
+    """
+    Return the cache key of the token the stored fragments of the nodes of
+    ``node_model`` are keyed by when it has no version field.
+    """
+    return 'django_dag_admin:row:%s:generation' % node_model._meta.label_lower
+
+
+def invalidate_fragments(node_model):
+    """Drop the stored row fragments of every node of ``node_model``"""
+    caches[RowFragmentCache.cache_alias].set(
+        get_generation_key(node_model), uuid4().hex, None)
+
+
+def connect_fragments(node_model):
+    """
+    Drop the stored row fragments of ``node_model`` whenever one of its
+    nodes is saved or deleted, for admins without a ``row_version_field``.
+    """
+    uid = 'django_dag_admin:fragments:%s' % node_model._meta.label_lower
+
+    def node_changed(raw=False, **kwargs):
+        if not raw:
+            invalidate_fragments(node_model)
+
+    post_save.connect(node_changed, sender=node_model, weak=False, dispatch_uid=uid)
+    post_delete.connect(node_changed, sender=node_model, weak=False, dispatch_uid=uid)
+
+
+def disconnect_fragments(node_model):
+    """Undo ``connect_fragments``"""
+    uid = 'django_dag_admin:fragments:%s' % node_model._meta.label_lower
+    post_save.disconnect(sender=node_model, dispatch_uid=uid)
+    post_delete.disconnect(sender=node_model, dispatch_uid=uid)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Set based queries run directly against the edge table of a dag
+from django.db import connections, router
+from django.db.models.query import QuerySet
+
+NODE_DEPTH_SQL = """
+    WITH RECURSIVE dag_depth (node_id, depth) AS (
+        SELECT n.{node_pk}, 0
+        FROM {node_table} n
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {edge_table} e WHERE e.{child} = n.{node_pk}
+        )
+        UNION
+        SELECT e.{child}, d.depth + 1
+        FROM {edge_table} e
+        INNER JOIN dag_depth d ON e.{parent} = d.node_id
+    )
+    SELECT node_id, MIN(depth) FROM dag_depth GROUP BY node_id
+"""
+
+CLOSURE_SQL = """
+    WITH RECURSIVE dag_closure (node_id) AS (
+        SELECT e.{to_node} FROM {edge_table} e WHERE e.{from_node} IN ({seeds})
+        UNION
+        SELECT e.{to_node}
+        FROM {edge_table} e
+        INNER JOIN dag_closure c ON e.{from_node} = c.node_id
+    )
+    SELECT node_id FROM dag_closure
+"""
+
+SEEDS_SQL = """
+    UNION SELECT n.{node_pk} FROM {node_table} n WHERE n.{node_pk} IN ({seeds})
+"""
+
+EDGE_COUNTS_SQL = """
+    SELECT node_id, SUM(children_count), SUM(parents_count) FROM (
+        SELECT e.{parent} AS node_id, 1 AS children_count, 0 AS parents_count
+        FROM {edge_table} e WHERE e.{parent} IN ({pks})
+        UNION ALL
+        SELECT e.{child}, 0, 1
+        FROM {edge_table} e WHERE e.{child} IN ({pks})
+    ) edge_counts
+    GROUP BY node_id
+"""
+
+DESCENDANTS = 'descendants'
+ANCESTORS = 'ancestors'
+# Rows fetched at a time when streaming a closure
+CLOSURE_CHUNK_SIZE = 2000
+
+
+def get_graph_tables(node_model, connection):
+    """
+    Return the quoted table and column names used to query the graph of
+    ``node_model`` directly.
+    """
+    qn = connection.ops.quote_name
+    edge_model = node_model.get_edge_model()
+    return {
+        'node_table': qn(node_model._meta.db_table),
+        'node_pk': qn(node_model._meta.pk.column),
+        'edge_table': qn(edge_model._meta.db_table),
+        'parent': qn(edge_model._meta.get_field('parent').column),
+        'child': qn(edge_model._meta.get_field('child').column),
+    }
+
+
+def get_node_depths(node_model, using=None):
+    """
+    Return a ``{pk: depth}`` mapping for every node of ``node_model``, the
+    depth being the shortest distance from any root, using one query.
+    """
+    connection = connections[using or router.db_for_read(node_model)]
+    sql = NODE_DEPTH_SQL.format(**get_graph_tables(node_model, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return dict(cursor.fetchall())
+
+
+def get_edge_counts(node_model, pks, using=None):
+    """
+    Return a ``{pk: (children_count, parents_count)}`` mapping for the given
+    node pks, aggregated from the edge table in one query. Nodes without
+    any edge are left out.
+    """
+    pks = list(set(pks))
+    if not pks:
+        return {}
+    connection = connections[using or router.db_for_read(node_model)]
+    sql = EDGE_COUNTS_SQL.format(
+        pks=', '.join(['%s'] * len(pks)), **get_graph_tables(node_model, connection))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, pks + pks)
+        return {
+            pk: (int(children_count), int(parents_count))
+            for pk, children_count, parents_count in cursor.fetchall()
+        }
+
+
+def get_seeds_sql(seeds):
+    """
+    Return ``(sql, params)`` for the ``seeds`` of a closure, either a list
+    of pks or a queryset of nodes which is then used as a subquery.
+    """
+    if isinstance(seeds, QuerySet):
+        sql, params = seeds.order_by().values('pk').query.sql_with_params()
+        return sql, list(params)
+    seeds = list(seeds)
+    return ', '.join(['%s'] * len(seeds)) or 'NULL', seeds
+
+
+def get_closure_sql(node_model, seeds, direction=DESCENDANTS, include_self=False,
+                    connection=None):
+    """
+    Return ``(sql, params)`` selecting the pks of all the descendants (or
+    ancestors) of the ``seeds`` in one recursive query. ``seeds`` is a list
+    of pks or a queryset of nodes.
+    """
+    connection = connection or connections[router.db_for_read(node_model)]
+    tables = get_graph_tables(node_model, connection)
+    if direction == DESCENDANTS:
+        from_node, to_node = tables['parent'], tables['child']
+    elif direction == ANCESTORS:
+        from_node, to_node = tables['child'], tables['parent']
+    else:
+        raise ValueError('Unknown closure direction %r' % direction)
+    seeds_sql, seeds_params = get_seeds_sql(seeds)
+    sql = CLOSURE_SQL.format(
+        from_node=from_node, to_node=to_node, seeds=seeds_sql, **tables)
+    params = seeds_params
+    if include_self:
+        sql += SEEDS_SQL.format(seeds=seeds_sql, **tables)
+        params = seeds_params + seeds_params
+    return sql, params
+
+
+def iter_closure_pks(node_model, seeds, direction=DESCENDANTS, include_self=False,
+                     using=None, chunk_size=CLOSURE_CHUNK_SIZE):
+    """
+    Yield the pks of all the descendants (or ancestors) of the ``seeds``,
+    computed by one query and fetched ``chunk_size`` rows at a time.
+    """
+    connection = connections[using or router.db_for_read(node_model)]
+    sql, params = get_closure_sql(
+        node_model, seeds, direction, include_self, connection)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for pk, in rows:
+                yield pk
+
+
+def get_closure_pks(node_model, seeds, direction=DESCENDANTS, include_self=False,
+                    using=None):
+    """
+    Return the set of pks of all the descendants (or ancestors) of the
+    ``seeds``, using one query.
+    """
+    return set(iter_closure_pks(node_model, seeds, direction, include_self, using))
@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 # Additional node utilities
+from .depth import get_depth_provider
 
 
 def get_nodedepth(node, root=None):
     """Return the node's depth"""
+    if root is None:
+        provider = get_depth_provider(node._meta.model)
+        depth = provider.get_depth(node) if provider else None
+        if depth is not None:
+            return depth
     if node.is_island() or node.is_root():
         return 0
     if root:
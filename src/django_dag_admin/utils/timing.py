@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Phase timing of changelist and move requests
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from django.db import connections
+from ..signals import phase_timed
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run through it
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class PhaseTimer:
+    """
+    Records the wall time and number of queries of the named phases of a
+    request. Queries are counted on the ``using`` database alias, or each
+    of the aliases in a list. Each phase is logged and sent with the
+    ``phase_timed`` signal when it ends. Phases run within another phase
+    are counted in both. A disabled timer records nothing.
+    """
+    def __init__(self, sender, request, using='default', enabled=True):
+        self.sender = sender
+        self.request = request
+        if isinstance(using, str):
+            using = [using]
+        self.using = tuple(dict.fromkeys(using))
+        self.enabled = enabled
+        self.phases = []
+
+    def count_queries(self, counter):
+        """Return a context counting the queries run on each alias with ``counter``"""
+        stack = ExitStack()
+        for alias in self.using:
+            stack.enter_context(connections[alias].execute_wrapper(counter))
+        return stack
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        counter = QueryCounter()
+        start = time.perf_counter()
+        try:
+            with self.count_queries(counter):
+                yield
+        finally:
+            self.record(name, time.perf_counter() - start, counter.count)
+
+    def iter_phase(self, name, iterable):
+        """
+        Yields the items of ``iterable``, recording the time spent producing
+        them as the phase ``name`` once it is exhausted or closed. The time
+        spent by the consumer in between is not counted.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        counter = QueryCounter()
+        duration = 0
+        items = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    with self.count_queries(counter):
+                        item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.perf_counter() - start
+                yield item
+        finally:
+            self.record(name, duration, counter.count)
+
+    def record(self, name, duration, queries):
+        self.phases.append((name, duration, queries))
+        logger.debug(
+            '%s %s: %.1fms, %d queries', self.sender._meta.label, name, duration * 1000, queries,
+            extra={'phase': name, 'duration': duration, 'queries': queries},
+        )
+        phase_timed.send(
+            sender=self.sender, request=self.request,
+            phase=name, duration=duration, queries=queries,
+        )
+
+    def server_timing(self):
+        """
+        Return the recorded phases as the value of a ``Server-Timing`` header
+        """
+        return ', '.join(
+            '%s;dur=%.1f;desc="%d queries"' % (name, duration * 1000, queries)
+            for name, duration, queries in self.phases
+        )
@@ -1,23 +1,75 @@
+import copy
 from django.contrib.admin.views.main import (
     ChangeList, IGNORED_PARAMS as BASE_IGNORED_PARAMS
 )
 from django.core.paginator import InvalidPage
 from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import ValidationError
 from django.db.models import Count, F, Q
+from django.db.models.expressions import RawSQL
 from django.db.models import Exists
-from django.db.models import OuterRef, Subquery
+from django.db.models import OuterRef
+from django.utils.functional import cached_property
 from django.contrib.admin.views.main import (
     ALL_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, IS_POPUP_VAR, TO_FIELD_VAR
 )
+from .utils.counters import has_edge_counters
+from .utils.graph import ANCESTORS, DESCENDANTS, get_closure_sql, get_edge_counts
 # Additional changelist settings
 LAYOUT_VAR = 'sty'
-IGNORED_PARAMS = BASE_IGNORED_PARAMS + (LAYOUT_VAR, )
+TREE_PATH_VAR = 'dag_path'
+# Selection params, a comma separated list of node pks
+DESCENDANTS_VAR = 'descendants_of'
+ANCESTORS_VAR = 'ancestors_of'
+CLAN_VAR = 'clan_of'
+SELECTION_PARAMS = (DESCENDANTS_VAR, ANCESTORS_VAR, CLAN_VAR, )
+# Keyset pagination cursors, the path of the row a page starts after/ends before
+AFTER_VAR = 'dag_after'
+BEFORE_VAR = 'dag_before'
+IGNORED_PARAMS = BASE_IGNORED_PARAMS + (
+    LAYOUT_VAR, TREE_PATH_VAR, AFTER_VAR, BEFORE_VAR, ) + SELECTION_PARAMS
 TREE_LAYOUT = 'tree'
 LIST_LAYOUT = 'list'
 ORDERED_DAG_SEQUENCE_FIELD_NAME = '_sequence'
 
 
+class StreamedResults:
+    """
+    The results of a streamed show all page, loaded ``chunk_size`` at a time
+    by ``load_chunk`` from the ``rows`` (path rows or a queryset) each time
+    they are iterated.
+    """
+    def __init__(self, rows, count, load_chunk, chunk_size):
+        self.rows = rows
+        self.count = count
+        self.load_chunk = load_chunk
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if isinstance(self.rows, list):
+            rows = self.rows
+            for start in range(0, len(rows), self.chunk_size):
+                yield from self.load_chunk(rows[start:start + self.chunk_size])
+        else:
+            chunk = []
+            for row in self.rows.iterator(chunk_size=self.chunk_size):
+                chunk.append(row)
+                if len(chunk) == self.chunk_size:
+                    yield from self.load_chunk(chunk)
+                    chunk = []
+            yield from self.load_chunk(chunk)
+
+
 class DagChangeList(ChangeList):
+    def __init__(self, *args, load_results=True, **kwargs):
+        # Changelists built to render a few rows outside of the changelist
+        # page skip the results query, count and page
+        self.load_results = load_results
+        super().__init__(*args, **kwargs)
+
     def allow_node_drag(self, request):
         draggable = True
         for k, v in self.params.items():
@@ -49,6 +101,44 @@ class DagChangeList(ChangeList):
                 del lookup_params[ignored]
         return lookup_params
 
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return self.apply_selection(qs)
+
+    def get_selection_seeds(self, param):
+        """
+        Return the node pks given in the ``param`` selection param.
+        """
+        to_python = self.model._meta.pk.to_python
+        try:
+            return [to_python(pk) for pk in self.params[param].split(',') if pk]
+        except ValidationError as e:
+            raise IncorrectLookupParameters(e)
+
+    def apply_selection(self, qs):
+        """
+        Limit ``qs`` to the selected nodes and their descendants, ancestors
+        or both, each resolved as a recursive subquery on the edge table.
+        """
+        for param in SELECTION_PARAMS:
+            if param not in self.params:
+                continue
+            seeds = self.get_selection_seeds(param)
+            descendants = Q(pk__in=RawSQL(*get_closure_sql(
+                self.model, seeds, DESCENDANTS, include_self=True)))
+            ancestors = Q(pk__in=RawSQL(*get_closure_sql(
+                self.model, seeds, ANCESTORS, include_self=True)))
+            if param == DESCENDANTS_VAR:
+                qs = qs.filter(descendants)
+            elif param == ANCESTORS_VAR:
+                qs = qs.filter(ancestors)
+            else:
+                qs = qs.filter(descendants | ancestors)
+        return qs
+
+    def has_selection(self):
+        return any(param in self.params for param in SELECTION_PARAMS)
+
     def _convert_order_node_to_edge(self, ordering):
         for part in ordering:
             if isinstance(part, str):
@@ -63,16 +153,10 @@ class DagChangeList(ChangeList):
                 yield "{}child__{}".format(order_type, base)
 
     def get_results_tree(self, request):
-        qs = self.queryset \
-            .annotate(
-                children_count=Count('children', distinct=True),
-                usage_count=Subquery(
-                    self.model.get_node_model().objects
-                        .filter(pk=OuterRef('id'))
-                        .annotate(usage_count=Count('parents__pk'))
-                        .values('usage_count')
-                )
-            )
+        # Only the tree needs the node paths, they are annotated on the
+        # unfiltered nodes as the filters may drop ancestors on the paths
+        qs = self.model_admin.annotate_paths(self.root_queryset, self.path_cache) \
+            .filter(pk__in=self.queryset.order_by().values('pk'))
         qs = self.apply_select_related(qs)
         ordering = self.get_ordering(request, qs)
         if self.model.sequence_manager:
@@ -80,8 +164,176 @@ class DagChangeList(ChangeList):
         else:
             ordering = ['dag_pk_path', ]
         qs = qs.order_by(*ordering)
+        lazy_depth = self.get_lazy_tree_depth(request)
+        if lazy_depth is not None and self.path_cache is not None:
+            # Cached paths know their depth, the deeper rows are never read.
+            # Without the cache the rows are built by get_lazy_path_rows.
+            qs = qs.filter(dag_path_depth__lt=lazy_depth)
         return qs
 
+    def get_lazy_tree_depth(self, request):
+        """
+        Return the number of tree levels rendered up front in a lazy tree, or
+        ``None`` when the whole tree is rendered. Filtered or searched trees
+        are always rendered in full.
+        """
+        if not self.model_admin.lazy_tree:
+            return None
+        if self.get_layout_style(request) != TREE_LAYOUT:
+            return None
+        if self.query or self.get_filters_params() or self.has_selection():
+            return None
+        return max(1, self.model_admin.lazy_tree_depth)
+
+    def get_node_results(self, request, pks):
+        """
+        Return a ``{pk: node}`` mapping of the given nodes, annotated as the
+        tree results are, for rendering individual rows.
+        """
+        qs = self.apply_select_related(self.model_admin.get_node_queryset(request))
+        nodes = qs.in_bulk(pks)
+        self.annotate_edge_counts(nodes.values())
+        return nodes
+
+    def get_children_results(self, request, parent_id):
+        """
+        Return the ``(node, edge_id)`` children of a node, in tree order, for
+        expanding a row of a lazy tree.
+        """
+        edges = self.order_edges(self.model.get_edge_model().objects.filter(parent_id=parent_id))
+        edges = list(edges.values_list('child_id', 'pk'))
+        nodes = self.get_node_results(request, [child_id for child_id, edge_id in edges])
+        return [
+            (nodes[child_id], edge_id)
+            for child_id, edge_id in edges if child_id in nodes
+        ]
+
+    def order_edges(self, edges):
+        """
+        Order ``edges`` as their children are shown below a parent
+        """
+        if self.model.sequence_manager:
+            order_component = self.model.sequence_manager \
+                .get_edge_rel_sort_query_component(self.model, 'child', 'parent')
+            return edges \
+                .annotate(**{ORDERED_DAG_SEQUENCE_FIELD_NAME: order_component}) \
+                .order_by(ORDERED_DAG_SEQUENCE_FIELD_NAME)
+        return edges.order_by('child_id')
+
+    def get_lazy_path_rows(self, request, depth):
+        """
+        Return the ``(pk, node path)`` rows of the first ``depth`` levels of
+        a lazy tree, in tree order. They are built from the roots and edges,
+        a query per level, so the paths of the deeper levels are never
+        computed. Roots are ordered by pk.
+        """
+        nodes = self.root_queryset.order_by()
+        roots = list(
+            nodes.filter(parents__isnull=True).order_by('pk').values_list('pk', flat=True))
+        children = {}
+        level = set(roots)
+        for _ in range(depth - 1):
+            if not level:
+                break
+            edges = self.order_edges(self.model.get_edge_model().objects.filter(
+                parent_id__in=level, child__in=nodes.values('pk')))
+            for parent_id in level:
+                children[parent_id] = []
+            for parent_id, child_id in edges.values_list('parent_id', 'child_id'):
+                children[parent_id].append(child_id)
+            level = set(
+                child_id for child_ids in children.values() for child_id in child_ids
+            ) - set(children)
+
+        sep = self.model_admin.path_seperator
+        rows = []
+        stack = [[pk] for pk in reversed(roots)]
+        while stack:
+            path = stack.pop()
+            rows.append((path[-1], sep.join(map(str, path))))
+            if len(path) < depth:
+                stack.extend(path + [child_id] for child_id in reversed(children.get(path[-1], ())))
+        return rows
+
+    def annotate_edge_counts(self, nodes):
+        """
+        Set ``children_count`` and ``usage_count`` (the number of parents) on
+        the given nodes, aggregated from the edge table in a single query for
+        the displayed nodes only rather than joined into the results query.
+        Models using ``DagCounterMixin`` already hold the counts.
+        """
+        nodes = list(nodes)
+        if has_edge_counters(self.model):
+            for node in nodes:
+                node.usage_count = node.parents_count
+            return nodes
+        counts = get_edge_counts(self.model, [node.pk for node in nodes])
+        for node in nodes:
+            node.children_count, node.usage_count = counts.get(node.pk, (0, 0))
+        return nodes
+
+    def get_path_rows(self, request, qs):
+        """
+        Return the ``(pk, node path)`` rows of the tree queryset ``qs``, in
+        tree order, as a values queryset that is counted by the count
+        strategy and sliced to the page by the database. The path query
+        thus runs twice, for the count and for the page, rather than every
+        path being loaded to count them. The rows of lazy trees without a
+        path cache are built as a list.
+        """
+        lazy_depth = self.get_lazy_tree_depth(request)
+        if lazy_depth is not None and self.path_cache is None:
+            self.path_rows = self.get_lazy_path_rows(request, lazy_depth)
+        else:
+            self.path_rows = qs.values_list('pk', 'dag_node_path')
+        return self.path_rows
+
+    def get_path_results(self, request, rows):
+        """
+        Return a node for each of the ``(pk, node path)`` rows, nodes on
+        several paths being fetched once and copied for each path.
+        """
+        qs = self.apply_select_related(self.model_admin.get_node_queryset(request))
+        nodes = qs.in_bulk(set(pk for pk, path in rows))
+        results = []
+        for pk, path in rows:
+            node = copy.copy(nodes[pk])
+            node.dag_node_path = path
+            results.append(node)
+        return results
+
+    @cached_property
+    def path_cache(self):
+        """The path cache model the tree is read from, if it can be used"""
+        return self.model_admin.get_path_cache()
+
+    @cached_property
+    def filtered_pks(self):
+        """
+        The set of node pks matching the current filters, computed once per
+        changelist without the count annotations of the result querysets.
+        """
+        return set(self.queryset.order_by().values_list('pk', flat=True))
+
+    def get_edge_map(self, paths):
+        """
+        Return a ``{(parent_id, child_id): edge_id}`` mapping for the last
+        edge of each of the given node paths, resolved with a single query.
+        """
+        pairs = set(
+            (path[-2], path[-1]) for path in paths if len(path) > 1
+        )
+        if not pairs:
+            return {}
+        parent_ids, child_ids = zip(*pairs)
+        edges = self.model.get_edge_model().objects \
+            .filter(parent_id__in=set(parent_ids), child_id__in=set(child_ids)) \
+            .values_list('parent_id', 'child_id', 'pk')
+        return {
+            (str(parent_id), str(child_id)): edge_id
+            for parent_id, child_id, edge_id in edges
+        }
+
     def get_results_edgetree(self, request):
         qs = (
             self.model.get_edge_model()
@@ -107,62 +359,141 @@ class DagChangeList(ChangeList):
         return qs
 
     def get_results_list(self, request):
-        qs = self.queryset.annotate(
-                children_count=Count('children', distinct=True),
-                usage_count=Subquery(
-                    self.model.get_node_model()
-                        .objects
-                        .filter(pk=OuterRef('id'))
-                        .annotate(usage_count=Count('parents__pk'))
-                        .values('usage_count')
-                )
-            )
-        qs = self.apply_select_related(qs)
+        qs = self.apply_select_related(self.queryset)
         ordering = self.get_ordering(request, qs)
         qs = qs.order_by(*ordering)
         return qs
 
     def get_results(self, request):
-        self.result_list_extra = []
+        if not self.load_results:
+            return
+        timer = self.model_admin.get_phase_timer(request)
+        with timer.phase('get_results'):
+            self.result_list_extra = []
 
-        # Add annotation to show detached nodes here
-        # to self.queryset look for no parent matching path / parents
-        if self.get_layout_style(request) == LIST_LAYOUT:
-            qs = self.get_results_list(request)
-        else:
-            qs = self.get_results_tree(request)
+            # Add annotation to show detached nodes here
+            # to self.queryset look for no parent matching path / parents
+            keyset_field = self.get_keyset_field(request)
+            self.path_rows = None
+            if self.get_layout_style(request) == LIST_LAYOUT:
+                qs = self.get_results_list(request)
+            else:
+                qs = self.get_results_tree(request)
+                if keyset_field is None:
+                    with timer.phase('paths'):
+                        qs = self.get_path_rows(request, qs)
+
+            paginator = self.model_admin.get_paginator(request, qs, self.list_per_page)
+            # Get the number of objects, with admin filters applied.
+            counter = self.model_admin.result_counter
+            with timer.phase('count'):
+                if isinstance(self.path_rows, list):
+                    result_count = paginator.count = len(self.path_rows)
+                else:
+                    result_count = paginator.count = counter.count(self, request, qs)
+
+                # Get the total number of objects, with no admin filters applied.
+                if self.model_admin.show_full_result_count:
+                    full_result_count = counter.full_count(self, request)
+                else:
+                    full_result_count = None
+            can_show_all = result_count <= self.list_max_show_all
+            multi_page = result_count > self.list_per_page
+
+            # Get the list of objects to display on this page.
+            self.keyset_paginated = keyset_field is not None
+            self.keyset_previous = self.keyset_next = None
+            # Virtual trees are rendered by the script, they are never streamed
+            self.streaming = bool(
+                self.show_all and can_show_all and self.model_admin.stream_show_all and
+                not self.model_admin.virtual_tree)
+            if self.streaming:
+                result_list = self.get_streamed_results(request, qs, result_count)
+            elif (self.show_all and can_show_all) or not multi_page:
+                result_list = qs[:] if self.path_rows is not None else qs._clone()
+            elif self.keyset_paginated:
+                result_list = self.get_keyset_page(qs, keyset_field)
+            else:
+                try:
+                    result_list = paginator.page(self.page_num + 1).object_list
+                except InvalidPage:
+                    raise IncorrectLookupParameters
+            if not self.streaming:
+                if self.path_rows is not None:
+                    result_list = self.get_path_results(request, result_list)
+                with timer.phase('edge_counts'):
+                    result_list = self.annotate_edge_counts(result_list)
 
-        paginator = self.model_admin.get_paginator(request, qs, self.list_per_page)
-        # Get the number of objects, with admin filters applied.
-        result_count = paginator.count
+            self.result_count = result_count
+            self.show_full_result_count = self.model_admin.show_full_result_count
+            # Admin actions are shown if there is at least one entry
+            # or if entries are not counted because show_full_result_count is disabled
+            self.show_admin_actions = not self.show_full_result_count or bool(full_result_count)
+            self.full_result_count = full_result_count
+            self.result_list = result_list
+            self.can_show_all = can_show_all
+            self.multi_page = multi_page
+            self.paginator = paginator
 
-        # Get the total number of objects, with no admin filters applied.
-        if self.model_admin.show_full_result_count:
-            full_result_count = self.root_queryset.count()
+    def get_streamed_results(self, request, qs, count):
+        """
+        Return the results of a show all page as an iterable loading the
+        nodes, and their edge counts, ``stream_chunk_size`` at a time, so the
+        page can be rendered while it is sent.
+        """
+        if self.path_rows is not None:
+            def load_chunk(rows):
+                return self.annotate_edge_counts(self.get_path_results(request, rows))
         else:
-            full_result_count = None
-        can_show_all = result_count <= self.list_max_show_all
-        multi_page = result_count > self.list_per_page
+            load_chunk = self.annotate_edge_counts
+        return StreamedResults(qs, count, load_chunk, self.model_admin.stream_chunk_size)
+
+    def get_keyset_field(self, request):
+        """
+        Return the path annotation tree pages are keyed on, or ``None`` when
+        the results are paginated by offset.
+        """
+        if not self.model_admin.keyset_pagination:
+            return None
+        if self.get_layout_style(request) != TREE_LAYOUT:
+            return None
+        if self.get_lazy_tree_depth(request) is not None and \
+                self.path_cache is None:
+            # Lazy trees are built level by level, a page of paths can't be
+            # selected without computing them all
+            return None
+        if self.model.sequence_manager:
+            return 'dag_sequence_path'
+        return 'dag_pk_path'
 
-        # Get the list of objects to display on this page.
-        if (self.show_all and can_show_all) or not multi_page:
-            result_list = qs._clone()
+    def get_keyset_page(self, qs, field):
+        """
+        Return the rows of ``qs`` following the path in the ``AFTER_VAR``
+        param, or preceding the one in ``BEFORE_VAR``, so pages are not
+        shifted by nodes moved on earlier pages. The paths are only read with
+        an index range scan when ``path_cache_model`` stores them, otherwise
+        the recursive query still computes every path before the page is cut
+        out of it.
+        Sets the cursors of the previous and next pages.
+        """
+        size = self.list_per_page
+        before = self.params.get(BEFORE_VAR)
+        after = self.params.get(AFTER_VAR)
+        if before is not None:
+            rows = list(qs.filter(**{field + '__lt': before}).order_by('-' + field)[:size + 1])
+            has_previous, has_next = len(rows) > size, True
+            rows = rows[:size][::-1]
         else:
-            try:
-                result_list = paginator.page(self.page_num + 1).object_list
-            except InvalidPage:
-                raise IncorrectLookupParameters
-
-        self.result_count = result_count
-        self.show_full_result_count = self.model_admin.show_full_result_count
-        # Admin actions are shown if there is at least one entry
-        # or if entries are not counted because show_full_result_count is disabled
-        self.show_admin_actions = not self.show_full_result_count or bool(full_result_count)
-        self.full_result_count = full_result_count
-        self.result_list = result_list
-        self.can_show_all = can_show_all
-        self.multi_page = multi_page
-        self.paginator = paginator
+            if after is not None:
+                qs = qs.filter(**{field + '__gt': after})
+            rows = list(qs[:size + 1])
+            has_previous, has_next = after is not None, len(rows) > size
+            rows = rows[:size]
+        if rows and has_previous:
+            self.keyset_previous = getattr(rows[0], field)
+        if rows and has_next:
+            self.keyset_next = getattr(rows[-1], field)
+        return rows
 
     def _get_default_layout_style(self):
         layout_style = 'tree'
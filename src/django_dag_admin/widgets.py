@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Widgets for Django-Dag Models"""
+
+from django import forms
+from django.conf import settings
+from django.urls import reverse
+
+
+class DagParentSelect(forms.Select):
+    """
+    Select widget which only renders the chosen node, the candidate parents
+    are fetched page by page from the admin as the user searches them.
+    """
+    def __init__(self, model, admin_site, attrs=None, choices=(), for_node=None):
+        super().__init__(attrs, choices)
+        self.model = model
+        self.admin_site = admin_site
+        self.for_node = for_node
+
+    def get_url(self):
+        opts = self.model._meta
+        return reverse('%s:%s_%s_parent_candidates' % (
+            self.admin_site.name, opts.app_label, opts.model_name))
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs=extra_attrs)
+        attrs.update({
+            'data-ajax--url': self.get_url(),
+            'data-dag-node': '' if self.for_node is None else str(self.for_node),
+            'data-allow-clear': 'false' if self.is_required else 'true',
+            'data-placeholder': '',
+        })
+        attrs['class'] = ' '.join(filter(None, [attrs.get('class'), 'dag-parent-select']))
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        """Return the selected options only"""
+        field = self.choices.field
+        default = (None, [], 0)
+        groups = [default]
+        selected_choices = {
+            str(v) for v in value if str(v) not in field.empty_values
+        }
+        if not self.is_required:
+            default[1].append(self.create_option(name, '', '', False, 0))
+        if not selected_choices:
+            return groups
+        to_field_name = field.to_field_name or 'pk'
+        for obj in self.choices.queryset.filter(**{'%s__in' % to_field_name: selected_choices}):
+            default[1].append(self.create_option(
+                name, getattr(obj, to_field_name), field.label_from_instance(obj),
+                True, len(default[1])))
+        return groups
+
+    @property
+    def media(self):
+        extra = '' if settings.DEBUG else '.min'
+        return forms.Media(
+            js=(
+                'admin/js/vendor/jquery/jquery%s.js' % extra,
+                'admin/js/vendor/select2/select2.full%s.js' % extra,
+                'admin/js/jquery.init.js',
+                'django-dag-admin/django-dag-admin-select.js',
+            ),
+            css={
+                'screen': (
+                    'admin/css/vendor/select2/select2%s.css' % extra,
+                    'admin/css/autocomplete.css',
+                ),
+            },
+        )
@@ -1,6 +1,9 @@
 from django.contrib import admin
+from django_dag_admin.admin import DjangoDagAdmin
 from . import models
 
+dag_site = admin.AdminSite(name='dag_admin')
+
 
 @admin.register(models.ConcreteNode)
 class NodeAdmin(admin.ModelAdmin):
@@ -10,3 +13,14 @@ class NodeAdmin(admin.ModelAdmin):
 @admin.register(models.ConcreteEdge)
 class EdgeAdmin(admin.ModelAdmin):
     fields = ('name', )
+
+
+@admin.register(models.ConcreteNode, site=dag_site)
+class DagNodeAdmin(DjangoDagAdmin):
+    fields = ('name', )
+
+
+@admin.register(models.CountedNode, site=dag_site)
+class CountedNodeAdmin(DjangoDagAdmin):
+    fields = ('name', )
+    path_cache_model = models.CountedPath
@@ -1,6 +1,7 @@
 from django.db import models
 
 from django_dag.models import node_factory, edge_factory
+from django_dag_admin.models import DagCounterMixin, path_cache_factory
 
 
 class ConcreteNode(node_factory('ConcreteEdge')):
@@ -17,3 +18,19 @@ class ConcreteEdge(edge_factory(ConcreteNode, concrete=False)):
 
     def __str__(self):  # pragma: no cover
         return 'Edge %d' % self.pk
+
+
+class CountedNode(DagCounterMixin, node_factory('CountedEdge')):
+    """Test node storing its edge counters"""
+    name = models.CharField(max_length=32)
+
+    def __str__(self):  # pragma: no cover
+        return 'Counted node %d' % self.pk
+
+
+class CountedEdge(edge_factory(CountedNode, concrete=False)):
+    """Test edge between counted nodes"""
+
+
+class CountedPath(path_cache_factory(CountedNode, CountedEdge)):
+    """Cached root to node paths of the counted nodes"""
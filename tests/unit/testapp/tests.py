@@ -1,12 +1,39 @@
 # -*- coding: utf-8 -*-
 """Unit/Functional tests"""
 
+import json
+import os
+import re
+import sys
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qsl, urlsplit
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, OuterRef, Subquery
 from django.template import Template, Context
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
-from django.urls import reverse
+from django.contrib.auth.models import Permission
+from django.test import Client, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+from django.utils import translation
 from django.templatetags.static import static
-from .models import ConcreteNode
+from django_dag_admin.forms import MoveNodeForm
+from django_dag_admin.signals import phase_timed
+from django_dag_admin.templatetags import admin_dag_tree
+from django_dag_admin.utils.count import BaseCount, CachedCount
+from django_dag_admin.utils.depth import CachedDepthProvider
+from django_dag_admin.utils.fragments import connect_fragments, disconnect_fragments
+from django_dag_admin.utils.graph import (
+    ANCESTORS, get_closure_pks, get_edge_counts, iter_closure_pks
+)
+from django_dag_admin.views import DagChangeList
+from .admin import CountedNodeAdmin, DagNodeAdmin, dag_site
+from .models import ConcreteEdge, ConcreteNode, CountedEdge, CountedNode, CountedPath
 
 
 class AdminTests(TestCase):
@@ -48,6 +75,929 @@ class AdminTests(TestCase):
         self.assertEqual(new_node.name, new_name)
 
 
+class DagAdminTestMixin:
+    def setUp(self,):
+        usermodel = get_user_model()
+        self.u = usermodel.objects.create_user(
+            "Jim", 'jim@example.com', 'password')
+        self.u.is_superuser = True
+        self.u.is_staff = True
+        self.u.save()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.u)
+
+    def build_tree(self, width):
+        """
+        Build a root with ``width`` children, each child having a leaf of
+        its own and sharing a common leaf with its siblings.
+        """
+        root = ConcreteNode.objects.create(name='root')
+        shared = ConcreteNode.objects.create(name='shared')
+        for idx in range(width):
+            child = ConcreteNode.objects.create(name='child %d' % idx)
+            root.add_child(child)
+            child.add_child(ConcreteNode.objects.create(name='leaf %d' % idx))
+            child.add_child(shared)
+        return root
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.admin_client.get(url, params or {})
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+
+class DagChangeListQueryTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def test_tree_query_count_is_independent_of_page_size(self):
+        self.build_tree(2)
+        self.count_queries(self.url)
+        small = self.count_queries(self.url)
+        self.build_tree(10)
+        large = self.count_queries(self.url)
+        self.assertEqual(small, large)
+
+    def test_rows_carry_edge_counts(self):
+        root = self.build_tree(2)
+        resp = self.admin_client.get(self.url, {'sty': 'list'})
+        counts = {
+            node.name: (node.children_count, node.usage_count)
+            for node in resp.context['cl'].result_list
+        }
+        self.assertEqual(counts[root.name], (2, 0))
+        self.assertEqual(counts['child 0'], (2, 1))
+        self.assertEqual(counts['shared'], (0, 2))
+
+    def test_tree_paths_are_counted_and_paged_in_sql(self):
+        """
+        The path query runs once for the count and once for the page, the
+        paths are never loaded in full to be counted.
+        """
+        self.build_tree(2)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.admin_client.get(self.url)
+        cl = resp.context['cl']
+        self.assertEqual(len([
+            query for query in ctx.captured_queries if 'RECURSIVE' in query['sql'].upper()
+        ]), 2)
+        # The shared leaf shows on two paths
+        self.assertEqual(cl.result_count, ConcreteNode.objects.count() + 1)
+        shared = [node for node in cl.result_list if node.name == 'shared']
+        self.assertEqual(len(shared), 2)
+        self.assertNotEqual(shared[0].dag_node_path, shared[1].dag_node_path)
+        self.assertNotIn('dag_node_path', cl.queryset.query.annotations)
+
+    def test_tree_page_is_sliced_by_the_database(self):
+        self.build_tree(2)
+        model_admin = dag_site._registry[ConcreteNode]
+        with mock.patch.object(model_admin, 'list_per_page', 2):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.admin_client.get(self.url, {'p': 1})
+        cl = resp.context['cl']
+        self.assertEqual(len(cl.result_list), 2)
+        self.assertTrue(any(
+            'dag_node_path' in query['sql'] and 'LIMIT 2' in query['sql']
+            for query in ctx.captured_queries))
+
+
+@skipUnless(os.environ.get('DAG_BENCHMARK_EDGES'), 'set DAG_BENCHMARK_EDGES to run')
+class EdgeCountBenchmark(TestCase):
+    """
+    Compares the joined count annotations the changelist used to run with
+    the grouped edge query on a page of a large graph.
+    """
+    def setUp(self):
+        size = int(os.environ['DAG_BENCHMARK_EDGES'])
+        ConcreteNode.objects.bulk_create(
+            ConcreteNode(name='node %d' % idx) for idx in range(size // 2 + 1))
+        pks = list(ConcreteNode.objects.order_by('pk').values_list('pk', flat=True))
+        ConcreteEdge.objects.bulk_create(
+            ConcreteEdge(parent_id=pks[idx // 2], child_id=pks[idx // 2 + 1 + idx % 2])
+            for idx in range(size) if idx // 2 + 1 + idx % 2 < len(pks)
+        )
+
+    def timed(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    def test_grouped_edge_counts_beat_joined_annotations(self):
+        nodes = ConcreteNode.objects.order_by('pk')
+
+        def joined():
+            qs = nodes.annotate(
+                children_count=Count('children', distinct=True),
+                usage_count=Subquery(
+                    ConcreteNode.objects
+                    .filter(pk=OuterRef('id'))
+                    .annotate(usage_count=Count('parents__pk'))
+                    .values('usage_count')))
+            qs.count()
+            list(qs[:100])
+
+        def grouped():
+            nodes.count()
+            get_edge_counts(ConcreteNode, [node.pk for node in nodes[:100]])
+
+        self.assertLess(self.timed(grouped), self.timed(joined))
+
+
+class LazyTreeTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+    children_url = reverse_lazy("dag_admin:testapp_concretenode_tree_children")
+
+    def setUp(self):
+        super().setUp()
+        self.root = ConcreteNode.objects.create(name='root')
+        self.child = ConcreteNode.objects.create(name='child')
+        self.leaf = ConcreteNode.objects.create(name='leaf')
+        self.root.add_child(self.child)
+        self.child.add_child(self.leaf)
+
+    def test_lazy_tree_renders_first_level_only(self):
+        with mock.patch.object(DagNodeAdmin, 'lazy_tree', True):
+            resp = self.admin_client.get(self.url)
+        self.assertContains(resp, 'id="path-%d"' % self.root.pk)
+        self.assertNotContains(resp, 'id="path-%d-%d"' % (self.root.pk, self.child.pk))
+        self.assertContains(resp, 'collapse collapsed lazy')
+
+    def test_lazy_tree_never_computes_the_deep_paths(self):
+        with mock.patch.object(DagNodeAdmin, 'lazy_tree', True), \
+                CaptureQueriesContext(connection) as ctx:
+            resp = self.admin_client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse([
+            query for query in ctx.captured_queries if 'RECURSIVE' in query['sql'].upper()])
+        with mock.patch.multiple(DagNodeAdmin, lazy_tree=True, lazy_tree_depth=2):
+            resp = self.admin_client.get(self.url)
+        self.assertEqual(
+            [row.dag_node_path.split(resp.context['cl'].model_admin.path_seperator)
+             for row in resp.context['cl'].result_list],
+            [[str(self.root.pk)], [str(self.root.pk), str(self.child.pk)]])
+
+    def test_lazy_tree_reads_the_cached_paths_of_the_first_levels(self):
+        root = CountedNode.objects.create(name='root')
+        child = CountedNode.objects.create(name='child')
+        root.add_child(child)
+        url = reverse("dag_admin:testapp_countednode_changelist")
+        with mock.patch.object(CountedNodeAdmin, 'lazy_tree', True):
+            resp = self.admin_client.get(url)
+        self.assertContains(resp, 'id="path-%d"' % root.pk)
+        self.assertNotContains(resp, 'id="path-%d-%d"' % (root.pk, child.pk))
+
+    def test_tree_children_renders_child_rows(self):
+        resp = self.admin_client.get(self.children_url, {'dag_path': self.root.pk})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'id="path-%d-%d"' % (self.root.pk, self.child.pk))
+        self.assertNotContains(
+            resp, 'id="path-%d-%d-%d"' % (self.root.pk, self.child.pk, self.leaf.pk))
+
+    def test_tree_children_skips_the_changelist_results(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.admin_client.get(self.children_url, {'dag_path': self.root.pk})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse([
+            query for query in ctx.captured_queries if 'RECURSIVE' in query['sql'].upper()])
+
+    def test_tree_children_rejects_malformed_path(self):
+        resp = self.admin_client.get(self.children_url, {'dag_path': 'x-y'})
+        self.assertEqual(resp.status_code, 400)
+
+
+class CountStrategyTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.build_tree(2)
+        self.model_admin = dag_site._registry[ConcreteNode]
+        caches['default'].clear()
+
+    def result_count(self, counter, params=None):
+        with mock.patch.object(self.model_admin, 'result_counter', counter):
+            resp = self.admin_client.get(self.url, params or {})
+        self.assertEqual(resp.status_code, 200)
+        return resp.context['cl'].result_count
+
+    def test_base_count_counts_nodes(self):
+        self.assertEqual(
+            self.result_count(BaseCount(ConcreteNode), {'sty': 'list'}),
+            ConcreteNode.objects.count())
+
+    def test_base_count_reaches_the_last_tree_page(self):
+        # The shared leaf shows on two paths, one row more than there are nodes
+        paths = ConcreteNode.objects.count() + 1
+        with mock.patch.multiple(
+                self.model_admin, list_per_page=2, result_counter=BaseCount(ConcreteNode)):
+            resp = self.admin_client.get(self.url, {'p': (paths - 1) // 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['cl'].result_count, paths)
+        self.assertEqual(len(resp.context['cl'].result_list), 1)
+
+    def test_cached_count_is_reused(self):
+        counter = CachedCount(ConcreteNode)
+        count = self.result_count(counter)
+        ConcreteNode.objects.create(name='new root')
+        self.assertEqual(self.result_count(counter), count)
+        caches['default'].clear()
+        self.assertEqual(self.result_count(counter), count + 1)
+
+    def test_pages_share_the_cached_count(self):
+        counter = CachedCount(ConcreteNode, counter=BaseCount)
+        with mock.patch.object(self.model_admin, 'list_per_page', 2), \
+                mock.patch.object(counter._counter, 'count', wraps=counter._counter.count) as count:
+            for page in (0, 1):
+                with mock.patch.object(self.model_admin, 'result_counter', counter):
+                    resp = self.admin_client.get(self.url, {'sty': 'list', 'p': page})
+                self.assertEqual(resp.status_code, 200)
+        self.assertEqual(count.call_count, 1)
+        self.assertNotEqual(
+            counter.get_cache_key(resp.context['cl']), counter.get_cache_key())
+
+
+class KeysetPaginationTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.build_tree(2)
+        self.model_admin = dag_site._registry[ConcreteNode]
+
+    def page(self, params=None):
+        with mock.patch.multiple(self.model_admin, keyset_pagination=True, list_per_page=3):
+            resp = self.admin_client.get(self.url, params or {})
+        self.assertEqual(resp.status_code, 200)
+        cl = resp.context['cl']
+        return [row.dag_pk_path for row in cl.result_list], cl
+
+    def test_pages_follow_the_path_cursor(self):
+        first, cl = self.page()
+        self.assertEqual(len(first), 3)
+        self.assertIsNone(cl.keyset_previous)
+        second, cl = self.page({'dag_after': cl.keyset_next})
+        self.assertEqual(len(second), 3)
+        self.assertLess(first[-1], second[0])
+        previous, cl = self.page({'dag_before': cl.keyset_previous})
+        self.assertEqual(previous, first)
+        self.assertIsNone(cl.keyset_previous)
+
+
+class RowFragmentCacheTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.build_tree(2)
+        self.model_admin = dag_site._registry[ConcreteNode]
+        caches['default'].clear()
+
+    def count_renders(self, **options):
+        with mock.patch.multiple(self.model_admin, **options), mock.patch(
+                'django_dag_admin.templatetags.admin_dag_tree.render_result_fragments',
+                wraps=admin_dag_tree.render_result_fragments) as render:
+            resp = self.admin_client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        return render.call_count
+
+    def test_nodes_are_rendered_once_per_request(self):
+        self.assertEqual(self.count_renders(), ConcreteNode.objects.count())
+
+    def test_fragments_are_stored_across_requests(self):
+        self.assertEqual(
+            self.count_renders(row_fragment_cache=True), ConcreteNode.objects.count())
+        self.assertEqual(self.count_renders(row_fragment_cache=True), 0)
+
+    def test_stored_fragments_are_keyed_by_language(self):
+        with translation.override('en'):
+            self.count_renders(row_fragment_cache=True)
+        with translation.override('fr'):
+            self.assertEqual(
+                self.count_renders(row_fragment_cache=True), ConcreteNode.objects.count())
+
+    def test_saving_a_node_drops_the_stored_fragments(self):
+        connect_fragments(ConcreteNode)
+        self.addCleanup(disconnect_fragments, ConcreteNode)
+        self.count_renders(row_fragment_cache=True)
+        node = ConcreteNode.objects.get(name='shared')
+        node.name = 'renamed'
+        node.save()
+        self.assertEqual(
+            self.count_renders(row_fragment_cache=True), ConcreteNode.objects.count())
+
+    def test_rows_of_a_node_differ_by_path_only(self):
+        resp = self.admin_client.get(self.url)
+        cl = resp.context['cl']
+        row_cache = admin_dag_tree.get_row_cache(cl, resp.wsgi_request)
+        node = ConcreteNode.objects.get(name='shared')
+        shallow = list(admin_dag_tree.items_for_result(cl, node, None, depth=1, row_cache=row_cache))
+        deep = list(admin_dag_tree.items_for_result(cl, node, None, depth=3, row_cache=row_cache))
+        link = [idx for idx, cell in enumerate(shallow) if 'drag-handler' in cell][0]
+        self.assertEqual(shallow[:link] + shallow[link + 1:], deep[:link] + deep[link + 1:])
+        self.assertEqual(shallow[link].count('class="spacer"'), 1)
+        self.assertEqual(deep[link].count('class="spacer"'), 3)
+
+
+class StreamingTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.build_tree(3)
+        self.model_admin = dag_site._registry[ConcreteNode]
+
+    def row_ids(self, content):
+        return re.findall(r'id="(path-[0-9-]+)"', content)
+
+    def test_show_all_is_streamed(self):
+        expected = self.row_ids(self.admin_client.get(self.url, {'all': ''}).content.decode())
+        with mock.patch.multiple(
+                self.model_admin, stream_show_all=True, stream_chunk_size=2, list_per_page=2):
+            resp = self.admin_client.get(self.url, {'all': ''})
+            self.assertTrue(resp.streaming)
+            content = b''.join(resp.streaming_content).decode()
+        self.assertEqual(self.row_ids(content), expected)
+        self.assertNotIn('django-dag-admin:streamed-rows', content)
+
+    def test_streamed_rows_are_labelled_as_rendered(self):
+        child = ConcreteNode.objects.get(name='child 0')
+        for params in ({'sty': 'list', 'descendants_of': child.pk}, {'descendants_of': child.pk}):
+            params['all'] = ''
+            rendered = self.admin_client.get(self.url, params).content.decode()
+            with mock.patch.multiple(self.model_admin, stream_show_all=True, stream_chunk_size=2):
+                resp = self.admin_client.get(self.url, params)
+                streamed = b''.join(resp.streaming_content).decode()
+            self.assertEqual(
+                streamed.count('Attached Nodes'), rendered.count('Attached Nodes'), params)
+            self.assertEqual(self.row_ids(streamed), self.row_ids(rendered))
+        self.assertIn('Attached Nodes', rendered)
+
+    def test_streamed_page_keeps_the_response_headers(self):
+        changelist_view = admin.ModelAdmin.changelist_view
+
+        def set_headers(model_admin, request, extra_context=None):
+            response = changelist_view(model_admin, request, extra_context)
+            response['Cache-Control'] = 'private'
+            response.set_cookie('dag-tree', 'open')
+            return response
+
+        with mock.patch.object(admin.ModelAdmin, 'changelist_view', set_headers), \
+                mock.patch.object(self.model_admin, 'stream_show_all', True):
+            resp = self.admin_client.get(self.url, {'all': ''})
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Cache-Control'], 'private')
+        self.assertTrue(resp['Content-Type'].startswith('text/html'))
+        self.assertEqual(resp.cookies['dag-tree'].value, 'open')
+
+
+class TreeJsonTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+    json_url = reverse_lazy("dag_admin:testapp_concretenode_tree_json")
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.build_tree(3)
+        self.model_admin = dag_site._registry[ConcreteNode]
+
+    def get_json(self, params=None):
+        resp = self.admin_client.get(self.json_url, params or {})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_rows_match_the_rendered_tree(self):
+        content = self.admin_client.get(self.url, {'all': ''}).content.decode()
+        data = self.get_json({'all': ''})
+        path = data['fields'].index('path')
+        self.assertEqual(
+            ['path-%s' % row[path] for row in data['attached'] + data['detached']],
+            re.findall(r'id="(path-[0-9-]+)"', content))
+
+    def test_cells_are_sent_once_per_node(self):
+        data = self.get_json({'all': ''})
+        node = data['fields'].index('node')
+        rows = data['attached'] + data['detached']
+        self.assertGreater(len(rows), ConcreteNode.objects.count())
+        self.assertEqual(set(data['nodes']), set(row[node] for row in rows))
+
+    def test_children_of_path(self):
+        data = self.get_json({'dag_path': self.root.pk})
+        parent = data['fields'].index('parent')
+        self.assertEqual(len(data['attached']), 3)
+        self.assertEqual(set(row[parent] for row in data['attached']), {str(self.root.pk)})
+
+    def test_children_of_path_skip_the_changelist_results(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_json({'dag_path': self.root.pk})
+        self.assertFalse([
+            query for query in ctx.captured_queries if 'RECURSIVE' in query['sql'].upper()])
+
+    def test_malformed_path_is_rejected(self):
+        resp = self.admin_client.get(self.json_url, {'dag_path': 'x-y'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_virtual_tree_embeds_the_rows(self):
+        with mock.patch.object(self.model_admin, 'virtual_tree', True):
+            resp = self.admin_client.get(self.url)
+        self.assertContains(resp, 'id="dag-tree-json"')
+        self.assertNotContains(resp, 'id="path-')
+
+
+class InstrumentationTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.root = self.build_tree(2)
+        self.model_admin = dag_site._registry[ConcreteNode]
+        self.phases = []
+        phase_timed.connect(self.receiver, sender=ConcreteNode)
+        self.addCleanup(phase_timed.disconnect, self.receiver, sender=ConcreteNode)
+
+    def receiver(self, sender, request, phase, duration, queries, **kwargs):
+        self.phases.append((phase, queries))
+
+    def instrumented(self, **options):
+        return mock.patch.multiple(
+            self.model_admin, instrument_changelist=True, server_timing_header=True, **options)
+
+    def test_changelist_phases_are_recorded(self):
+        with self.instrumented():
+            resp = self.admin_client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        phases = dict(self.phases)
+        for phase in ('get_results', 'paths', 'count', 'edge_counts', 'tree_results', 'result_tree'):
+            self.assertIn(phase, phases)
+            self.assertIn('%s;dur=' % phase, resp['Server-Timing'])
+        self.assertGreaterEqual(phases['get_results'], phases['paths'] + phases['edge_counts'])
+
+    def test_move_is_recorded(self):
+        child = ConcreteNode.objects.get(name='child 0')
+        with self.instrumented():
+            resp = self.admin_client.post(self.url + 'move/', {
+                'node_id': child.pk,
+                'node_parent_id': self.root.pk,
+                'sibling_id': self.root.pk,
+                'sibling_parent_id': '',
+                'as_child': 0,
+                'target_path': '',
+            })
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('move_node', dict(self.phases))
+        self.assertGreater(dict(self.phases)['move_node'], 0)
+        self.assertIn('move_node;dur=', resp['Server-Timing'])
+
+    def test_queries_are_counted_on_the_write_database(self):
+        request = RequestFactory().post(self.url + 'move/')
+        with mock.patch('django_dag_admin.admin.router.db_for_read', return_value='replica'), \
+                mock.patch('django_dag_admin.admin.router.db_for_write', return_value='default'):
+            timer = self.model_admin.get_phase_timer(request)
+        self.assertEqual(timer.using, ('replica', 'default'))
+
+    def test_nothing_is_recorded_by_default(self):
+        resp = self.admin_client.get(self.url)
+        self.assertEqual(self.phases, [])
+        self.assertFalse(resp.has_header('Server-Timing'))
+
+
+class SelectionTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_changelist")
+
+    def setUp(self):
+        super().setUp()
+        self.root = ConcreteNode.objects.create(name='root')
+        self.child = ConcreteNode.objects.create(name='child')
+        self.leaf = ConcreteNode.objects.create(name='leaf')
+        self.other = ConcreteNode.objects.create(name='other')
+        self.root.add_child(self.child)
+        self.child.add_child(self.leaf)
+
+    def selected(self, params):
+        resp = self.admin_client.get(self.url, params)
+        self.assertEqual(resp.status_code, 200)
+        return set(resp.context['cl'].queryset.values_list('name', flat=True))
+
+    def test_descendants_of(self):
+        self.assertEqual(
+            self.selected({'descendants_of': self.child.pk}), {'child', 'leaf'})
+
+    def test_ancestors_of(self):
+        self.assertEqual(
+            self.selected({'ancestors_of': self.child.pk}), {'root', 'child'})
+
+    def test_clan_of(self):
+        self.assertEqual(
+            self.selected({'clan_of': self.child.pk}), {'root', 'child', 'leaf'})
+
+    def test_detached_labels_cost_a_fixed_number_of_queries(self):
+        def count(width):
+            root = self.build_tree(width)
+            leaves = ConcreteNode.objects.filter(
+                name__startswith='leaf', parents__parents=root).values_list('pk', flat=True)
+            params = {'descendants_of': ','.join(map(str, leaves))}
+            resp = self.admin_client.get(self.url, params)
+            self.assertContains(resp, 'Detached from Nodes', count=width)
+            return self.count_queries(self.url, params)
+
+        count(2)
+        self.assertEqual(count(2), count(6))
+
+    def test_action_redirects_to_selection(self):
+        resp = self.admin_client.post(self.url, {
+            'action': 'show_decendants',
+            '_selected_action': [self.child.pk],
+        })
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn('descendants_of=%d' % self.child.pk, resp.url)
+        self.assertNotIn('pk__in', resp.url)
+
+    def test_action_drops_nodes_covered_by_the_selection(self):
+        resp = self.admin_client.post(self.url, {
+            'action': 'show_decendants',
+            '_selected_action': [self.root.pk, self.child.pk, self.other.pk],
+        })
+        self.assertEqual(resp.status_code, 302)
+        seeds = dict(parse_qsl(urlsplit(resp.url).query))['descendants_of']
+        self.assertEqual(
+            set(seeds.split(',')), {str(self.root.pk), str(self.other.pk)})
+
+    def test_closure_of_a_queryset(self):
+        selection = ConcreteNode.objects.filter(pk__in=[self.child.pk, self.other.pk])
+        self.assertEqual(
+            set(iter_closure_pks(ConcreteNode, selection, ANCESTORS, chunk_size=1)),
+            {self.root.pk})
+        self.assertEqual(
+            get_closure_pks(ConcreteNode, selection, include_self=True),
+            {self.child.pk, self.leaf.pk, self.other.pk})
+
+
+class MoveNodeTests(DagAdminTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("dag_admin:testapp_concretenode_changelist") + 'move/'
+        self.root = ConcreteNode.objects.create(name='root')
+        self.first = ConcreteNode.objects.create(name='first')
+        self.second = ConcreteNode.objects.create(name='second')
+        self.root.add_child(self.first)
+        self.root.add_child(self.second)
+
+    def move(self, node, node_parent, sibling, sibling_parent, as_child, target_path):
+        return self.admin_client.post(self.url, {
+            'node_id': node.pk,
+            'node_parent_id': node_parent.pk if node_parent else '',
+            'sibling_id': sibling.pk,
+            'sibling_parent_id': sibling_parent.pk if sibling_parent else '',
+            'as_child': int(as_child),
+            'target_path': target_path,
+        })
+
+    def test_move_returns_rows_below_target(self):
+        resp = self.move(
+            self.second, self.root, self.first, self.root, True,
+            '%d-%d' % (self.root.pk, self.first.pk))
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['status'], 'OK')
+        self.assertEqual(data['node_id'], str(self.second.pk))
+        self.assertEqual(data['old_parent_id'], str(self.root.pk))
+        self.assertFalse(data['as_clone'])
+        self.assertIn(
+            'id="path-%d-%d-%d"' % (self.root.pk, self.first.pk, self.second.pk),
+            data['rows'])
+        self.assertEqual(list(self.first.children.all()), [self.second])
+        self.assertEqual(list(self.root.children.all()), [self.first])
+
+    def test_circular_move_is_rejected(self):
+        resp = self.move(
+            self.root, None, self.first, self.root, True,
+            '%d-%d' % (self.root.pk, self.first.pk))
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['status'], 'error')
+        self.assertEqual(list(self.first.children.all()), [])
+
+    def count_move_queries(self, width):
+        root = self.build_tree(width)
+        children = list(root.children.order_by('pk'))
+        node, target = children[-1], children[0]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.move(node, root, target, root, True, '%d-%d' % (root.pk, target.pk))
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_programming_errors_are_not_reported_as_failed_moves(self):
+        with mock.patch.object(DagNodeAdmin, 'perform_move', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.move(
+                    self.second, self.root, self.first, self.root, True,
+                    '%d-%d' % (self.root.pk, self.first.pk))
+
+    def test_move_requires_change_permission(self):
+        view_only = get_user_model().objects.create_user(
+            'viewer', 'viewer@example.com', 'password', is_staff=True)
+        view_only.user_permissions.add(Permission.objects.get(
+            codename='view_concretenode', content_type__app_label='testapp'))
+        self.admin_client.force_login(view_only)
+        resp = self.move(
+            self.second, self.root, self.first, self.root, True,
+            '%d-%d' % (self.root.pk, self.first.pk))
+        self.assertEqual(resp.status_code, 403)
+        self.assertCountEqual(self.root.children.all(), [self.first, self.second])
+
+    def test_move_does_not_load_the_changelist_results(self):
+        with mock.patch.object(DagChangeList, 'get_results_tree') as get_results_tree:
+            resp = self.move(
+                self.second, self.root, self.first, self.root, True,
+                '%d-%d' % (self.root.pk, self.first.pk))
+        self.assertEqual(resp.status_code, 200)
+        get_results_tree.assert_not_called()
+
+    def test_move_query_count_is_independent_of_graph_size(self):
+        self.count_move_queries(2)
+        small = self.count_move_queries(2)
+        large = self.count_move_queries(20)
+        self.assertEqual(small, large, 'a move took %d queries' % large)
+
+
+class BulkMoveTests(DagAdminTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("dag_admin:testapp_concretenode_changelist") + 'move/bulk/'
+        self.root = ConcreteNode.objects.create(name='root')
+        self.first = ConcreteNode.objects.create(name='first')
+        self.second = ConcreteNode.objects.create(name='second')
+        self.third = ConcreteNode.objects.create(name='third')
+        for node in (self.first, self.second, self.third):
+            self.root.add_child(node)
+
+    def move_as_child(self, node, target):
+        return {
+            'node_id': node.pk,
+            'node_parent_id': self.root.pk,
+            'sibling_id': target.pk,
+            'sibling_parent_id': self.root.pk,
+            'as_child': 1,
+            'target_path': '%d-%d' % (self.root.pk, target.pk),
+        }
+
+    def post(self, moves):
+        return self.admin_client.post(
+            self.url, json.dumps({'moves': moves}), content_type='application/json')
+
+    def test_bulk_move_applies_every_move(self):
+        resp = self.post([
+            self.move_as_child(self.second, self.first),
+            self.move_as_child(self.third, self.first),
+        ])
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual([result['status'] for result in data['results']], ['OK', 'OK'])
+        self.assertTrue(all(result['edge_id'] for result in data['results']))
+        self.assertEqual(len(data['rendered']), 1)
+        self.assertCountEqual(self.first.children.all(), [self.second, self.third])
+        self.assertEqual(list(self.root.children.all()), [self.first])
+
+    def test_bulk_move_does_not_load_the_changelist_results(self):
+        with mock.patch.object(DagChangeList, 'get_results_tree') as get_results_tree:
+            resp = self.post([self.move_as_child(self.second, self.first)])
+        self.assertEqual(resp.status_code, 200)
+        get_results_tree.assert_not_called()
+
+    def test_bulk_move_rejects_malformed_moves(self):
+        for moves in (['x'], {'node_id': self.first.pk}, 'x', [None]):
+            resp = self.post(moves)
+            self.assertEqual(resp.status_code, 400, moves)
+            self.assertEqual(resp.json()['status'], 'error')
+
+    def test_bulk_move_requires_change_permission(self):
+        view_only = get_user_model().objects.create_user(
+            'viewer', 'viewer@example.com', 'password', is_staff=True)
+        view_only.user_permissions.add(Permission.objects.get(
+            codename='view_concretenode', content_type__app_label='testapp'))
+        self.admin_client.force_login(view_only)
+        resp = self.post([self.move_as_child(self.second, self.first)])
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(list(self.first.children.all()), [])
+
+    def test_bulk_move_rejects_cycles_created_by_the_batch(self):
+        resp = self.post([
+            self.move_as_child(self.first, self.second),
+            self.move_as_child(self.second, self.first),
+        ])
+        self.assertEqual(resp.status_code, 400)
+        data = resp.json()
+        self.assertEqual([result['status'] for result in data['results']], ['OK', 'error'])
+        self.assertCountEqual(
+            self.root.children.all(), [self.first, self.second, self.third])
+
+    def test_malformed_moves_are_rejected(self):
+        resp = self.admin_client.post(
+            self.url, 'not json', content_type='application/json')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_programming_errors_are_not_reported_as_failed_moves(self):
+        with mock.patch.object(DagNodeAdmin, 'apply_moves', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post([self.move_as_child(self.second, self.first)])
+
+
+class ParentCandidatesTests(DagAdminTestMixin, TestCase):
+    url = reverse_lazy("dag_admin:testapp_concretenode_parent_candidates")
+
+    def test_candidates_exclude_node_and_descendants(self):
+        root = ConcreteNode.objects.create(name='root')
+        child = ConcreteNode.objects.create(name='child')
+        leaf = ConcreteNode.objects.create(name='leaf')
+        other = ConcreteNode.objects.create(name='other')
+        root.add_child(child)
+        child.add_child(leaf)
+        resp = self.admin_client.get(self.url, {'node': child.pk})
+        self.assertEqual(resp.status_code, 200)
+        self.assertCountEqual(
+            [result['id'] for result in resp.json()['results']],
+            [str(root.pk), str(other.pk)])
+
+    def test_candidates_are_paginated(self):
+        for idx in range(25):
+            ConcreteNode.objects.create(name='node %d' % idx)
+        first = self.admin_client.get(self.url).json()
+        second = self.admin_client.get(self.url, {'page': 2}).json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertTrue(first['pagination']['more'])
+        self.assertEqual(len(second['results']), 5)
+        self.assertFalse(second['pagination']['more'])
+
+    def test_candidates_match_the_term(self):
+        alpha = ConcreteNode.objects.create(name='alpha')
+        ConcreteNode.objects.create(name='beta')
+        resp = self.admin_client.get(self.url, {'term': 'ALP'})
+        self.assertEqual(
+            [result['id'] for result in resp.json()['results']], [str(alpha.pk)])
+
+    def test_candidates_use_the_admin_search_fields(self):
+        alpha = ConcreteNode.objects.create(name='alpha')
+        ConcreteNode.objects.create(name='beta')
+        model_admin = dag_site._registry[ConcreteNode]
+        with mock.patch.object(model_admin, 'search_fields', ['=name']):
+            partial = self.admin_client.get(self.url, {'term': 'alp'}).json()
+            exact = self.admin_client.get(self.url, {'term': 'alpha'}).json()
+        self.assertEqual(partial['results'], [])
+        self.assertEqual([result['id'] for result in exact['results']], [str(alpha.pk)])
+
+
+class DepthProviderTests(TestCase):
+    def test_cached_depths_follow_edge_changes(self):
+        root = ConcreteNode.objects.create(name='root')
+        child = ConcreteNode.objects.create(name='child')
+        leaf = ConcreteNode.objects.create(name='leaf')
+        root.add_child(child)
+        child.add_child(leaf)
+        provider = CachedDepthProvider(ConcreteNode)
+        provider.connect()
+        self.addCleanup(provider.disconnect)
+        provider.invalidate()
+        self.assertEqual(provider.get_depth(root), 0)
+        self.assertEqual(provider.get_depth(child), 1)
+        self.assertEqual(provider.get_depth(leaf), 2)
+        root.add_child(leaf)
+        self.assertEqual(provider.get_depth(leaf), 1)
+
+
+class EdgeCounterTests(DagAdminTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = CountedNode.objects.create(name='root')
+        self.child = CountedNode.objects.create(name='child')
+        self.leaf = CountedNode.objects.create(name='leaf')
+        self.root.add_child(self.child)
+        self.root.add_child(self.leaf)
+        self.child.add_child(self.leaf)
+
+    def counters(self, node):
+        node.refresh_from_db()
+        return node.children_count, node.parents_count
+
+    def test_counters_follow_edge_changes(self):
+        self.assertEqual(self.counters(self.root), (2, 0))
+        self.assertEqual(self.counters(self.leaf), (0, 2))
+        CountedEdge.objects.get(parent=self.root, child=self.leaf).delete()
+        self.assertEqual(self.counters(self.root), (1, 0))
+        self.assertEqual(self.counters(self.leaf), (0, 1))
+        self.child.children.remove(self.leaf)
+        self.assertEqual(self.counters(self.child), (0, 1))
+        self.assertEqual(self.counters(self.leaf), (0, 0))
+
+    def test_counters_follow_an_edited_edge(self):
+        other = CountedNode.objects.create(name='other')
+        edge = CountedEdge.objects.get(parent=self.root, child=self.leaf)
+        edge.parent = other
+        edge.save()
+        self.assertEqual(self.counters(self.root), (1, 0))
+        self.assertEqual(self.counters(other), (1, 0))
+        self.assertEqual(self.counters(self.leaf), (0, 2))
+        edge.save()
+        self.assertEqual(self.counters(other), (1, 0))
+        self.assertEqual(self.counters(self.leaf), (0, 2))
+
+    def test_rebuild_command(self):
+        CountedNode.objects.update(children_count=0, parents_count=0)
+        call_command('rebuild_dag_counters', 'testapp.CountedNode', stdout=StringIO())
+        self.assertEqual(self.counters(self.root), (2, 0))
+        self.assertEqual(self.counters(self.child), (1, 1))
+        self.assertEqual(self.counters(self.leaf), (0, 2))
+
+    def test_changelist_reads_counters(self):
+        resp = self.admin_client.get(
+            reverse("dag_admin:testapp_countednode_changelist"), {'sty': 'list'})
+        counts = {
+            node.name: (node.children_count, node.usage_count)
+            for node in resp.context['cl'].result_list
+        }
+        self.assertEqual(counts, {'root': (2, 0), 'child': (1, 1), 'leaf': (0, 2)})
+
+
+class PathCacheTests(DagAdminTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = CountedNode.objects.create(name='root')
+        self.child = CountedNode.objects.create(name='child')
+        self.leaf = CountedNode.objects.create(name='leaf')
+        self.root.add_child(self.child)
+        self.child.add_child(self.leaf)
+
+    def paths(self):
+        sep = CountedPath.get_sort_settings()['sepchar']
+        return set(
+            tuple(int(pk) for pk in path.split(sep))
+            for path in CountedPath.objects.values_list('node_path', flat=True)
+        )
+
+    def test_paths_follow_edge_changes(self):
+        root, child, leaf = self.root.pk, self.child.pk, self.leaf.pk
+        self.assertEqual(self.paths(), {(root, ), (root, child), (root, child, leaf)})
+        self.child.children.remove(self.leaf)
+        self.assertEqual(self.paths(), {(root, ), (root, child), (leaf, )})
+
+    def test_rebuild_command(self):
+        expected = self.paths()
+        CountedPath.objects.all().delete()
+        call_command('rebuild_dag_paths', 'testapp.CountedPath', stdout=StringIO())
+        self.assertEqual(self.paths(), expected)
+        self.assertEqual(
+            CountedPath.objects.get(node=self.leaf).edge,
+            CountedEdge.objects.get(parent=self.child, child=self.leaf))
+
+    def test_changelist_computes_the_paths_missing_from_the_cache(self):
+        url = reverse("dag_admin:testapp_countednode_changelist")
+        root, child, leaf = self.root.pk, self.child.pk, self.leaf.pk
+        expected = ['path-%d' % root, 'path-%d-%d' % (root, child), 'path-%d-%d-%d' % (root, child, leaf)]
+        for unbuilt in (CountedPath.objects.all(), CountedPath.objects.filter(node=self.leaf)):
+            unbuilt.delete()
+            resp = self.admin_client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(re.findall(r'id="(path-[0-9-]+)"', resp.content.decode()), expected)
+            CountedPath.rebuild()
+
+
+class MoveFormTests(TestCase):
+    def test_dropdown_excludes_node_and_descendants(self):
+        root = ConcreteNode.objects.create(name='root')
+        child = ConcreteNode.objects.create(name='child')
+        leaf = ConcreteNode.objects.create(name='leaf')
+        other = ConcreteNode.objects.create(name='other')
+        root.add_child(child)
+        child.add_child(leaf)
+        root.add_child(other)
+        other.add_child(leaf)
+        with self.assertNumQueries(3):
+            options = MoveNodeForm.mk_dropdown_tree(ConcreteNode, for_node=child)
+        self.assertCountEqual(
+            [pk for pk, label in options],
+            [0, root.pk, other.pk])
+
+    def test_dropdown_repeats_shared_nodes(self):
+        root = ConcreteNode.objects.create(name='root')
+        child = ConcreteNode.objects.create(name='child')
+        other = ConcreteNode.objects.create(name='other')
+        leaf = ConcreteNode.objects.create(name='leaf')
+        root.add_child(child)
+        root.add_child(other)
+        child.add_child(leaf)
+        other.add_child(leaf)
+        options = MoveNodeForm.mk_dropdown_tree(ConcreteNode)
+        self.assertEqual([pk for pk, label in options].count(leaf.pk), 2)
+
+    def test_dropdown_of_a_deep_chain(self):
+        depth = sys.getrecursionlimit() + 10
+        nodes = ConcreteNode.objects.bulk_create(
+            ConcreteNode(name='node %d' % idx) for idx in range(depth))
+        if nodes[0].pk is None:
+            nodes = list(ConcreteNode.objects.order_by('pk'))
+        ConcreteEdge.objects.bulk_create(
+            ConcreteEdge(parent=parent, child=child)
+            for parent, child in zip(nodes, nodes[1:]))
+        options = MoveNodeForm.mk_dropdown_tree(ConcreteNode)
+        self.assertEqual([pk for pk, label in options], [0] + [node.pk for node in nodes])
+
+
 class TestAdminDagTemplateTags(TestCase):
     def test_dag_css(self):
         template = Template("{% load admin_list admin_dag_tree %}{% django_dag_admin_css %}")
@@ -1,8 +1,10 @@
 from django.urls import path
 from django.contrib import admin
+from .admin import dag_site
 
 admin.autodiscover()
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('dag_admin/', dag_site.urls),
 ]